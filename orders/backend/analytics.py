@@ -0,0 +1,90 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+from django.utils import timezone
+
+from .models import OrderItem, ShopSalesRollup, ProductSalesRollup
+from .shipments import ITEM_PRICE
+
+PERIODS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def _collect(items):
+    """
+    Собираем позиции заказов одним запросом и сворачиваем их в дневные суммы по магазинам и товарам
+    """
+
+    shops = defaultdict(lambda: [0, 0, set()])
+    products = defaultdict(lambda: [0, 0, set()])
+    lines = items.annotate(item_price=ITEM_PRICE).values_list(
+        'order_id', 'order__dt', 'product_info__shop_id', 'product_info__product_id', 'quantity', 'item_price')
+    for order_id, dt, shop_id, product_id, quantity, price in lines.iterator(chunk_size=2000):
+        day = timezone.localdate(dt)
+        for totals in (shops[(shop_id, day)], products[(shop_id, product_id, day)]):
+            totals[0] += quantity * price
+            totals[1] += quantity
+            totals[2].add(order_id)
+    return shops, products
+
+
+def _increment(model, keys, totals, sign):
+    # создаём недостающие строки без гонок, затем атомарно прибавляем к ним значения
+    model.objects.bulk_create([model(**dict(zip(keys, key))) for key in totals], ignore_conflicts=True)
+    for key, (revenue, units, orders) in totals.items():
+        model.objects.filter(**dict(zip(keys, key))).update(revenue=F('revenue') + sign * revenue,
+                                                            units=F('units') + sign * units,
+                                                            orders_count=F('orders_count') + sign * len(orders))
+
+
+def _apply(items, sign):
+    shops, products = _collect(items)
+    with transaction.atomic():
+        _increment(ShopSalesRollup, ('shop_id', 'day'), shops, sign)
+        _increment(ProductSalesRollup, ('shop_id', 'product_id', 'day'), products, sign)
+
+
+def apply_orders(order_ids, sign=1):
+    """
+    Учитываем заказы в витринах продаж: sign=1 при оформлении, sign=-1 при отмене
+    """
+
+    _apply(OrderItem.objects.filter(order_id__in=order_ids), sign)
+
+
+def apply_shipments(shipment_ids, sign=1):
+    """
+    Учитываем отдельные отправления: при отмене отправления из витрин вычитаются только позиции его магазина
+    """
+
+    _apply(OrderItem.objects.filter(order__shipments__id__in=shipment_ids,
+                                    order__shipments__shop_id=F('product_info__shop_id')), sign)
+
+
+def shop_sales(shop_id, period='day', date_from=None, date_to=None, top=5):
+    """
+    Отчёт о продажах магазина по дням/неделям/месяцам и топ товаров за выбранный интервал
+    """
+
+    trunc = PERIODS[period]
+    rollups = ShopSalesRollup.objects.filter(shop_id=shop_id)
+    products = ProductSalesRollup.objects.filter(shop_id=shop_id)
+    if date_from:
+        rollups = rollups.filter(day__gte=date_from)
+        products = products.filter(day__gte=date_from)
+    if date_to:
+        rollups = rollups.filter(day__lte=date_to)
+        products = products.filter(day__lte=date_to)
+    sales = rollups.annotate(period=trunc('day')).values('period').annotate(
+        revenue=Sum('revenue'), units=Sum('units'), orders=Sum('orders_count')).order_by('period')
+    top_products = products.values('product_id', name=F('product__name')).annotate(
+        revenue=Sum('revenue'), units=Sum('units')).order_by('-revenue')[:top]
+    return {
+        'sales': [dict(item, period=item['period'].isoformat()) for item in sales],
+        'top_products': list(top_products),
+    }
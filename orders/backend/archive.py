@@ -0,0 +1,106 @@
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Sum, F
+from django.db.models.functions import Coalesce
+
+from .baskets import invalidate_baskets
+from .models import Order, OrderArchive, ShipmentArchive
+from .serializers import OrderSerializer, ShipmentSerializer
+
+ARCHIVE_STATUSES = ('finish', 'canceled')
+
+
+def _pack(data):
+    return zlib.compress(json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False).encode())
+
+
+def _unpack(payload):
+    return json.loads(zlib.decompress(payload))
+
+
+def _shipment_data(order, shipment):
+    # как в SellerOrdersView: у заказа отправления видны только позиции его магазина
+    order.shop_items = [item for item in order.ordered_items.all() if item.product_info.shop_id == shipment.shop_id]
+    shipment.order = order
+    return ShipmentSerializer(shipment).data
+
+
+def archive_orders(before, batch_size=500):
+    """
+    Переносим исполненные и отменённые заказы старше before в архив.
+    Вместе с заказом архивируются его отправления с позициями своего магазина - история продавцов.
+    Каждая порция переносится в своей транзакции, чтобы не держать долгие блокировки. Возвращает число заказов.
+    """
+
+    archived = 0
+    while True:
+        with transaction.atomic():
+            ids = list(Order.objects.select_for_update(skip_locked=True).filter(
+                status__in=ARCHIVE_STATUSES, dt__lt=before).order_by('dt').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return archived
+            orders = Order.objects.filter(id__in=ids).select_related('address').prefetch_related(
+                'shipments', 'ordered_items__product_info__product__category',
+                'ordered_items__product_info__product_parameters__parameter').annotate(
+                total_sum=Sum(F('ordered_items__quantity') * Coalesce(F('ordered_items__price'),
+                                                                      F('ordered_items__product_info__price'))))
+            OrderArchive.objects.bulk_create([
+                OrderArchive(id=order.id, user_id=order.user_id, dt=order.dt, status=order.status,
+                             total_sum=order.total_sum or 0, payload=_pack(OrderSerializer(order).data))
+                for order in orders], ignore_conflicts=True)
+            ShipmentArchive.objects.bulk_create([
+                ShipmentArchive(id=shipment.id, order_id=order.id, shop_id=shipment.shop_id, dt=shipment.dt,
+                                status=shipment.status, payload=_pack(_shipment_data(order, shipment)))
+                for order in orders for shipment in order.shipments.all()], ignore_conflicts=True)
+            Order.objects.filter(id__in=ids).delete() # позиции заказов удаляются каскадно
+        archived += len(ids)
+
+
+def purge_baskets(before, batch_size=500):
+    """
+    Удаляем брошенные корзины, которые не изменялись с before. Возвращает число удалённых корзин.
+    """
+
+    purged = 0
+    while True:
+        baskets = dict(Order.objects.filter(status='basket', updated_at__lt=before).values_list(
+            'id', 'user_id')[:batch_size])
+        if not baskets:
+            return purged
+        # повторная проверка даты: корзину могли изменить между выборкой и удалением
+        Order.objects.filter(id__in=baskets, status='basket', updated_at__lt=before).delete()
+        invalidate_baskets(baskets.values())
+        purged += len(baskets)
+
+
+def archived_orders(user_id):
+    """
+    История заказов пользователя из архива в формате OrderSerializer
+    """
+
+    return [_unpack(payload) for payload in
+            OrderArchive.objects.filter(user_id=user_id).values_list('payload', flat=True)]
+
+
+def iter_archived(status, chunk_size=500):
+    """
+    Составы архивных заказов с заданным статусом в формате OrderSerializer, без загрузки всех сразу в память
+    """
+
+    payloads = OrderArchive.objects.filter(status=status).values_list('payload', flat=True)
+    for payload in payloads.iterator(chunk_size=chunk_size):
+        yield _unpack(payload)
+
+
+def archived_shipments(user_id, status=None):
+    """
+    История отправлений магазина продавца из архива в формате ShipmentSerializer
+    """
+
+    shipments = ShipmentArchive.objects.filter(shop__user_id=user_id)
+    if status:
+        shipments = shipments.filter(status=status)
+    return [_unpack(payload) for payload in shipments.values_list('payload', flat=True)]
@@ -0,0 +1,18 @@
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from .tokens import is_expired
+
+
+class ExpiringTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену с ограниченным сроком жизни: просроченный токен удаляется при проверке,
+    новый пользователь получает при следующем входе по паролю
+    """
+
+    def authenticate_credentials(self, key):
+        user, token = super().authenticate_credentials(key)
+        if is_expired('auth', token.created):
+            token.delete()
+            raise AuthenticationFailed('Срок действия токена истёк, войдите заново')
+        return user, token
@@ -0,0 +1,298 @@
+import bisect
+import fcntl
+import heapq
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum
+
+from .models import Product, ProductInfo, ProductSalesRollup
+
+MAGIC = b'PFX1'
+HEADER = struct.Struct('<4sIIIII') # сигнатура, документов, ключей, тяжёлых префиксов, длина их топов, порог
+SEPARATOR = '\x1f' # разделитель названия товара и моделей в тексте документа
+
+re_not_word = re.compile(r'[\W_]+')
+
+
+def autocomplete_settings():
+    config = {'PATH': settings.BASE_DIR / '.autocomplete' / 'products.idx', 'LIMIT': 10, 'HOT_RANGE': 256,
+              'CHECK_INTERVAL': 1.0}
+    config.update(getattr(settings, 'AUTOCOMPLETE', {}))
+    return config
+
+
+def normalize(text):
+    return re_not_word.sub(' ', text.lower().replace('ё', 'е')).strip()
+
+
+def document_keys(name, models):
+    """Ключи документа: название и модели целиком и с каждого следующего слова («iphone 15» для «apple iphone 15»)"""
+    keys = set()
+    for text in (name, *models):
+        words = normalize(text).split()
+        keys.update(' '.join(words[start:]) for start in range(len(words)))
+    return keys
+
+
+def load_documents(product_ids=None):
+    """
+    Документы индекса из БД: {id товара: (вес, название, модели)}. Вес - проданные единицы товара плюс один,
+    индексируются товары, которые есть хотя бы в одном открытом магазине.
+    """
+
+    products = Product.objects.filter(product_info__shop__opened=True)
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+    names = dict(products.values_list('id', 'name').distinct())
+    units = dict(ProductSalesRollup.objects.filter(product_id__in=names).values('product_id').annotate(
+        units=Sum('units')).values_list('product_id', 'units'))
+    models = {}
+    for product_id, model in ProductInfo.objects.filter(product_id__in=names, shop__opened=True).exclude(
+            model__isnull=True).exclude(model='').values_list('product_id', 'model').distinct():
+        models.setdefault(product_id, []).append(model)
+    return {product_id: (max(0, units.get(product_id) or 0) + 1, name, tuple(sorted(models.get(product_id, ()))))
+            for product_id, name in names.items()}
+
+
+def _offsets(blobs):
+    offsets, position = array('I', [0]), 0
+    for blob in blobs:
+        position += len(blob)
+        offsets.append(position)
+    return offsets
+
+
+def _hot_prefixes(keys, key_docs, weights, hot_range, top):
+    """
+    Готовые топы для «тяжёлых» префиксов - тех, с которых начинается больше hot_range ключей.
+    Обход дерева префиксов по отсортированным ключам снизу вверх: топ узла собирается из топов дочерних узлов,
+    поэтому каждый ключ просматривается один раз. Для остальных префиксов при поиске достаточно просмотреть
+    не больше hot_range ключей.
+    """
+
+    hot = {}
+
+    def best(candidates):
+        return heapq.nlargest(top, sorted(candidates), key=weights.__getitem__)
+
+    def walk(prefix, low, high):
+        length, candidates, position = len(prefix), set(), low
+        while position < high:
+            if len(keys[position]) == length: # ключ совпадает с префиксом целиком
+                candidates.add(key_docs[position])
+                position += 1
+                continue
+            child = keys[position][:length + 1]
+            end = bisect.bisect_left(keys, child + b'\xff', position, high)
+            candidates.update(walk(child, position, end) if end - position > hot_range else
+                              best(key_docs[position:end]))
+            position = end
+        hot[prefix] = best(candidates)
+        return hot[prefix]
+
+    if len(keys) > hot_range:
+        walk(b'', 0, len(keys))
+        del hot[b'']
+    return hot
+
+
+def write_snapshot(path, documents, hot_range=256, top=10):
+    """
+    Записываем снимок индекса: отсортированные ключи со смещениями, документы и готовые топы для тяжёлых
+    префиксов. Файл пишется рядом и подменяется атомарно через os.replace, читатели видят старый или новый снимок.
+    """
+
+    product_ids = sorted(documents)
+    docs = [SEPARATOR.join((documents[product_id][1], *documents[product_id][2])).encode()
+            for product_id in product_ids]
+    weights = array('I', (min(documents[product_id][0], 2 ** 32 - 1) for product_id in product_ids))
+    entries = sorted(((key.encode(), index) for index, product_id in enumerate(product_ids)
+                      for key in document_keys(documents[product_id][1], documents[product_id][2])),
+                     key=lambda entry: (entry[0], -weights[entry[1]]))
+    keys, key_docs = [key for key, _ in entries], array('I', (index for _, index in entries))
+    hot = _hot_prefixes(keys, key_docs, weights, hot_range, top)
+    hot_keys = sorted(hot)
+    hot_lists = [hot[key] for key in hot_keys]
+    hot_docs = array('I', (index for items in hot_lists for index in items))
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file = tempfile.NamedTemporaryFile(dir=path.parent, delete=False)
+    try:
+        with file:
+            file.write(HEADER.pack(MAGIC, len(docs), len(keys), len(hot_keys), len(hot_docs), hot_range))
+            for part in (_offsets(docs), array('I', product_ids), weights, _offsets(keys), key_docs,
+                         _offsets(hot_keys), _offsets(hot_lists), hot_docs):
+                file.write(part.tobytes())
+            for blobs in (docs, keys, hot_keys):
+                for blob in blobs:
+                    file.write(blob)
+        os.replace(file.name, path)
+    finally:
+        if os.path.exists(file.name): # запись не удалась, недописанный файл не нужен
+            os.unlink(file.name)
+
+
+class PrefixIndex:
+    """Снимок индекса, отображённый в память: общие страницы файла разделяются всеми процессами сервера"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, docs, entries, hot, hot_docs, self.hot_range = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError(f'{path} не является снимком индекса автодополнения')
+        view, position = memoryview(self.buffer), HEADER.size
+
+        def take(count):
+            nonlocal position
+            part = view[position:position + count * 4].cast('I')
+            position += count * 4
+            return part
+
+        self.doc_offsets, self.doc_products, self.doc_weights = take(docs + 1), take(docs), take(docs)
+        self.key_offsets, self.key_docs = take(entries + 1), take(entries)
+        self.hot_offsets, self.hot_list_offsets, self.hot_docs = take(hot + 1), take(hot + 1), take(hot_docs)
+        self.docs_start = position
+        self.keys_start = self.docs_start + self.doc_offsets[docs]
+        self.hot_start = self.keys_start + self.key_offsets[entries]
+        self.size = entries
+
+    def _key(self, index):
+        return self.buffer[self.keys_start + self.key_offsets[index]:self.keys_start + self.key_offsets[index + 1]]
+
+    def _hot_key(self, index):
+        return self.buffer[self.hot_start + self.hot_offsets[index]:self.hot_start + self.hot_offsets[index + 1]]
+
+    def _lower_bound(self, target, key, high):
+        low = 0
+        while low < high:
+            middle = (low + high) // 2
+            if key(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def document(self, index):
+        text = self.buffer[self.docs_start + self.doc_offsets[index]:self.docs_start + self.doc_offsets[index + 1]]
+        name, *models = text.decode().split(SEPARATOR)
+        return self.doc_products[index], self.doc_weights[index], name, tuple(models)
+
+    def documents(self):
+        """Все документы снимка в формате load_documents (для инкрементальной пересборки)"""
+        return {product_id: (weight, name, models) for product_id, weight, name, models in
+                map(self.document, range(len(self.doc_products)))}
+
+    def search(self, prefix, limit=10):
+        """
+        Товары, название или модель которых (или их часть с начала слова) начинается с prefix, по убыванию веса.
+        Для тяжёлых префиксов топ готов в снимке, для остальных просматривается не больше hot_range ключей.
+        """
+
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        target = prefix.encode()
+        position = self._lower_bound(target, self._hot_key, len(self.hot_offsets) - 1)
+        if position < len(self.hot_offsets) - 1 and self._hot_key(position) == target:
+            found = self.hot_docs[self.hot_list_offsets[position]:self.hot_list_offsets[position + 1]].tolist()
+        else:
+            start = self._lower_bound(target, self._key, self.size)
+            end = self._lower_bound(target + b'\xff', self._key, self.size)
+            found = heapq.nlargest(limit, sorted(set(self.key_docs[start:min(end, start + self.hot_range)])),
+                                   key=self.doc_weights.__getitem__)
+        return [{'id': self.doc_products[index], 'name': self.document(index)[2]} for index in found[:limit]]
+
+
+_index = None
+_index_lock = threading.Lock()
+_background = None # фоновая сборка отсутствующего снимка
+
+
+def _lock(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file = open(path.with_suffix('.lock'), 'w')
+    fcntl.flock(file, fcntl.LOCK_EX) # пересборки из разных процессов выполняются по очереди
+    return file
+
+
+def rebuild_index(product_ids=None):
+    """
+    Пересборка снимка: полная или только по изменившимся товарам (документы остальных берутся из старого снимка)
+    """
+
+    config = autocomplete_settings()
+    path = Path(config['PATH'])
+    with _lock(path):
+        if product_ids is not None and path.exists():
+            documents = PrefixIndex(path).documents()
+            for product_id in product_ids:
+                documents.pop(product_id, None)
+            documents.update(load_documents(product_ids))
+        else:
+            documents = load_documents()
+        write_snapshot(path, documents, config['HOT_RANGE'], config['LIMIT'])
+
+
+def _rebuild_in_background(product_ids):
+    try:
+        rebuild_index(product_ids)
+    finally:
+        connection.close() # фоновый поток сам закрывает своё соединение с БД
+
+
+def rebuild_index_async(product_ids=None):
+    """
+    Пересборка в фоновом потоке процесса сервера, чтобы не задерживать ответ продавцу. Поток не переживает
+    процесс, поэтому команды пересобирают индекс синхронно через rebuild_index.
+    """
+
+    thread = threading.Thread(target=_rebuild_in_background, daemon=True,
+                              args=(None if product_ids is None else set(product_ids),))
+    thread.start()
+    return thread
+
+
+def get_index(build=False):
+    """
+    Текущий снимок процесса. Файл проверяется не чаще CHECK_INTERVAL секунд и переотображается, если его
+    подменили. Снимок строится при прогреве (build=True) или командой build_autocomplete; если его всё же нет,
+    запрос не ждёт сборки: она запускается в фоне, а до её окончания возвращается None.
+    """
+
+    global _index, _background
+    config = autocomplete_settings()
+    path = Path(config['PATH'])
+    now = time.monotonic()
+    if _index and now - _index[1] < config['CHECK_INTERVAL']:
+        return _index[2]
+    with _index_lock:
+        if not path.exists():
+            if not build:
+                if _background is None or not _background.is_alive():
+                    _background = rebuild_index_async()
+                return None
+            rebuild_index()
+        stat = path.stat()
+        if _index is None or _index[0] != (stat.st_ino, stat.st_mtime_ns):
+            _index = ((stat.st_ino, stat.st_mtime_ns), now, PrefixIndex(path))
+        else:
+            _index = (_index[0], now, _index[2])
+    return _index[2]
+
+
+def autocomplete(prefix, limit=None):
+    """Подсказки по префиксу, не больше LIMIT (топы коротких префиксов хранятся только такой длины)"""
+    config = autocomplete_settings()
+    index = get_index()
+    return index.search(prefix, min(limit or config['LIMIT'], config['LIMIT'])) if index else []
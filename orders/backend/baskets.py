@@ -0,0 +1,54 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import Order
+
+
+def _cache():
+    return caches[getattr(settings, 'BASKET_CACHE_ALIAS', 'default')]
+
+
+def cached_basket(user_id, build):
+    """
+    Отрисованная корзина пользователя из кеша, при промахе - результат build().
+    Запись хранится вместе с поколением корзины: если корзину сбросили, пока build() выполнялся,
+    записанный результат не совпадёт с новым поколением и при следующем чтении будет пересчитан.
+    """
+
+    cache = _cache()
+    generation_key, data_key = f'basket-gen:{user_id}', f'basket:{user_id}'
+    cached = cache.get_many([generation_key, data_key])
+    generation, entry = cached.get(generation_key), cached.get(data_key)
+    if entry is not None and entry[0] == generation:
+        return entry[1]
+    data = build()
+    cache.set(data_key, (generation, data), getattr(settings, 'BASKET_CACHE_TTL', 3600))
+    return data
+
+
+def touch_basket(order_id):
+    """Отмечаем изменение корзины (позиции меняются без сохранения самого заказа)"""
+    Order.objects.filter(id=order_id).update(updated_at=timezone.now())
+
+
+def invalidate_baskets(user_ids):
+    """Сбрасываем закешированные корзины пользователей"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    cache = _cache()
+    cache.set_many({f'basket-gen:{user_id}': uuid.uuid4().hex for user_id in user_ids}, None)
+    cache.delete_many([f'basket:{user_id}' for user_id in user_ids])
+
+
+def basket_users(product_info_ids=None, shop_id=None):
+    """Пользователи, в корзинах которых лежат указанные предложения или предложения магазина"""
+    baskets = Order.objects.filter(status='basket')
+    if product_info_ids is not None:
+        baskets = baskets.filter(ordered_items__product_info_id__in=product_info_ids)
+    if shop_id is not None:
+        baskets = baskets.filter(ordered_items__product_info__shop_id=shop_id)
+    return set(baskets.values_list('user_id', flat=True).distinct())
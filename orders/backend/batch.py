@@ -0,0 +1,105 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+import ujson
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connection
+from django.http import HttpResponseServerError
+from django.urls import resolve, Resolver404
+from django.utils.log import log_response
+
+from .middleware import get_gates
+
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+
+def _form_value(value):
+    """Значение поля формы: вложенные списки и словари передаются строкой JSON, как их и ожидают представления"""
+    if isinstance(value, (dict, list)):
+        return ujson.dumps(value)
+    if isinstance(value, bool):
+        return str(value).lower()
+    return '' if value is None else str(value)
+
+
+def _sub_request(request, method, path, body):
+    """
+    Вложенный запрос с заголовками исходного. Пользователь и токен передаются готовыми, повторной аутентификации нет.
+    Тело-объект передаётся формой (представления рассчитаны на QueryDict со строковыми значениями),
+    остальные тела - JSON.
+    """
+
+    url = urlsplit(path)
+    if isinstance(body, dict):
+        content_type = 'application/x-www-form-urlencoded'
+        payload = urlencode({key: _form_value(value) for key, value in body.items()}).encode()
+    else:
+        content_type = 'application/json'
+        payload = ujson.dumps(body).encode() if body is not None else b''
+    environ = {key: value for key, value in request.META.items()
+               if not key.startswith('wsgi.') and key != 'HTTP_AUTHORIZATION'}
+    environ.update({'REQUEST_METHOD': method, 'PATH_INFO': url.path, 'SCRIPT_NAME': '', 'QUERY_STRING': url.query,
+                    'CONTENT_TYPE': content_type, 'CONTENT_LENGTH': str(len(payload)),
+                    'wsgi.input': io.BytesIO(payload)})
+    sub = WSGIRequest(environ)
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    return sub
+
+
+def _execute(request, item, threaded=False):
+    """Выполнение одного вложенного запроса тем же классом представления, что и при обычном вызове"""
+    method, path = item['method'], item['path']
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return {'status': 404, 'body': {'Status': False, 'Error': f'Адрес {path} не найден'}}
+    if match.url_name == 'batch':
+        return {'status': 400, 'body': {'Status': False, 'Error': 'Вложенные пакетные запросы не поддерживаются'}}
+    if getattr(getattr(match.func, 'view_class', None), 'view_is_async', False):
+        return {'status': 400, 'body': {'Status': False, 'Error': f'Потоковый адрес {path} в пакете не поддерживается'}}
+    gate = get_gates().get(match.url_name)
+    if gate and not gate.enter():
+        return {'status': 503, 'body': {'Status': False, 'Error': 'Сервер перегружен, повторите запрос позже'}}
+    sub = _sub_request(request, method, path, item.get('body'))
+    try:
+        try:
+            response = match.func(sub, *match.args, **match.kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        except Exception as error: # ошибка одного запроса не должна ронять весь пакет
+            log_response('Ошибка вложенного запроса: %s', path, response=HttpResponseServerError(), request=sub,
+                         exception=error)
+            return {'status': 500, 'body': {'Status': False, 'Error': 'Внутренняя ошибка сервера'}}
+        try:
+            body = ujson.loads(response.content)
+        except ValueError:
+            body = response.content.decode(errors='replace')
+        return {'status': response.status_code, 'body': body}
+    finally:
+        if gate:
+            gate.leave()
+        if threaded:
+            connection.close() # у каждого потока своё соединение с БД
+
+
+def run_batch(request, items, workers=4):
+    """
+    Выполняем вложенные запросы по порядку. Идущие подряд GET-запросы независимы и выполняются параллельно,
+    изменяющие запросы выполняются последовательно и разделяют группы чтения.
+    """
+
+    results = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        reads = []
+        for index, item in enumerate(items + [None]):
+            if item is not None and item['method'] == 'GET':
+                reads.append(index)
+                continue
+            for read, result in zip(reads, pool.map(lambda i: _execute(request, items[i], threaded=True), reads)):
+                results[read] = result
+            reads = []
+            if item is not None:
+                results[index] = _execute(request, item)
+    return [dict(result, id=item.get('id', index)) for index, (item, result) in enumerate(zip(items, results))]
@@ -0,0 +1,30 @@
+from django.db.models import F, Func, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Category, Product
+
+
+def with_ancestors(category_ids):
+    """
+    id категорий вместе со всеми их предками (берутся из материализованных путей)
+    """
+
+    paths = Category.objects.filter(id__in=category_ids).values_list('path', flat=True)
+    return {int(node) for path in paths for node in path.strip('/').split('/') if node}
+
+
+def subtree_path(category_id):
+    """Путь категории для выборки её поддерева по префиксу, None если категории нет"""
+    if not str(category_id).isdigit():
+        return None
+    return Category.objects.filter(id=category_id).values_list('path', flat=True).first()
+
+
+def refresh_product_counts(category_ids):
+    """
+    Пересчитываем кешированное количество товаров в поддеревьях затронутых категорий и их предков одним UPDATE
+    """
+
+    products = Product.objects.filter(category__path__startswith=OuterRef('path')).order_by().annotate(
+        count=Func(F('id'), function='COUNT')).values('count')
+    Category.objects.filter(id__in=with_ancestors(category_ids)).update(product_count=Coalesce(Subquery(products), 0))
@@ -0,0 +1,73 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, Func, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .categories import refresh_product_counts
+from .models import Category, Shop, ProductInfo
+
+
+def shop_category_counts(shop_id):
+    """
+    Предложения магазина по категориям: {id категории: (предложений, в наличии)}
+    """
+
+    counts = ProductInfo.objects.filter(shop_id=shop_id).values('product__category_id').annotate(
+        offers=Count('id'), in_stock=Count('id', filter=Q(quantity__gt=0))).order_by()
+    return {item['product__category_id']: (item['offers'], item['in_stock']) for item in counts}
+
+
+def apply_category_deltas(counts, sign=1):
+    """
+    Прибавляем (sign=1) или вычитаем (sign=-1) предложения к счётчикам категорий и всех их предков.
+    Строки обновляются по возрастанию id: параллельные загрузки блокируют общих предков в одном порядке
+    и не попадают во взаимную блокировку.
+    """
+
+    paths = dict(Category.objects.filter(id__in=[key for key in counts if key]).values_list('id', 'path'))
+    deltas = defaultdict(lambda: [0, 0])
+    for category_id, (offers, in_stock) in counts.items():
+        for node in paths.get(category_id, '').strip('/').split('/'):
+            if node:
+                deltas[int(node)][0] += sign * offers
+                deltas[int(node)][1] += sign * in_stock
+    for node, (offers, in_stock) in sorted(deltas.items()):
+        if offers or in_stock:
+            Category.objects.filter(id=node).update(offers_count=F('offers_count') + offers,
+                                                    in_stock_count=F('in_stock_count') + in_stock)
+
+
+def refresh_shop_counters(shop_id):
+    """Пересчёт счётчиков магазина по его предложениям (индекс по shop_id)"""
+    counts = ProductInfo.objects.filter(shop_id=shop_id).aggregate(
+        offers=Count('id'), in_stock=Count('id', filter=Q(quantity__gt=0)))
+    Shop.objects.filter(id=shop_id).update(offers_count=counts['offers'], in_stock_count=counts['in_stock'])
+
+
+def _count(queryset):
+    return Coalesce(Subquery(queryset.order_by().annotate(count=Func(F('id'), function='COUNT')).values('count')), 0)
+
+
+def _refresh_categories(categories):
+    offers = ProductInfo.objects.filter(product__category__path__startswith=OuterRef('path'), shop__opened=True)
+    categories.update(offers_count=_count(offers), in_stock_count=_count(offers.filter(quantity__gt=0)))
+
+
+def refresh_category_counters(category_ids):
+    """
+    Пересчёт счётчиков предложений категорий по всем открытым магазинам. Нужен, когда категорию переносят
+    в другое место дерева: предложения всех магазинов в её поддереве переходят от прежних предков к новым.
+    """
+
+    _refresh_categories(Category.objects.filter(id__in=category_ids))
+
+
+def rebuild_counters():
+    """
+    Полная пересборка всех счётчиков каталога набором UPDATE с подзапросами
+    """
+
+    offers = ProductInfo.objects.filter(shop_id=OuterRef('id'))
+    Shop.objects.update(offers_count=_count(offers), in_stock_count=_count(offers.filter(quantity__gt=0)))
+    _refresh_categories(Category.objects.all())
+    refresh_product_counts(Category.objects.values_list('id', flat=True))
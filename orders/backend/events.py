@@ -0,0 +1,212 @@
+import asyncio
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+from ujson import dumps
+
+from .models import OrderEvent
+
+EVENT_FIELDS = ('id', 'user_id', 'order_id', 'shop_id', 'kind', 'status', 'order_status', 'dt')
+
+
+def events_settings():
+    config = {'POLL': 1.0, 'HEARTBEAT': 15, 'MAX_AGE': 300, 'RETRY_MS': 3000, 'BATCH': 100, 'LAG': 30}
+    config.update(getattr(settings, 'ORDER_EVENTS', {}))
+    return config
+
+
+def record_events(kind, shipments):
+    """
+    Записываем события по отправлениям (queryset Shipment) одним INSERT: покупателю заказа и продавцу магазина.
+    Вызывается в транзакции оформления заказа или смены статуса, поэтому события видны только после фиксации.
+    """
+
+    events = []
+    for order_id, shop_id, buyer_id, seller_id, status, order_status in shipments.values_list(
+            'order_id', 'shop_id', 'order__user_id', 'shop__user_id', 'status', 'order__status'):
+        for user_id in {buyer_id, seller_id} - {None}:
+            events.append(OrderEvent(user_id=user_id, order_id=order_id, shop_id=shop_id, kind=kind, status=status,
+                                     order_status=order_status))
+    OrderEvent.objects.bulk_create(events)
+
+
+def purge_events(before, batch_size=1000):
+    """Удаляем события старше before порциями, возвращает число удалённых событий"""
+    purged = 0
+    while True:
+        ids = list(OrderEvent.objects.filter(dt__lt=before).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return purged
+        purged += OrderEvent.objects.filter(id__in=ids).delete()[0]
+
+
+def fetch_events(user_id, after, limit=100):
+    return list(OrderEvent.objects.filter(user_id=user_id, id__gt=after).values(*EVENT_FIELDS)[:limit])
+
+
+def fetch_late(user_id, after, since):
+    """
+    События пользователя с id не больше after, записанные после since. Транзакции фиксируются не в порядке
+    выдачи id, поэтому событие с меньшим id может стать видимым позже событий с большими id.
+    """
+
+    return list(OrderEvent.objects.filter(user_id=user_id, id__lte=after, dt__gte=since).values(*EVENT_FIELDS))
+
+
+def poll_events(after, since, seen, limit=1000):
+    """Новые события всех пользователей с id больше after и поздно зафиксированные события после since не из seen"""
+    events = list(OrderEvent.objects.filter(id__gt=after).values(*EVENT_FIELDS)[:limit])
+    late = set(OrderEvent.objects.filter(id__lte=after, dt__gte=since).values_list('id', flat=True)) - seen
+    if late:
+        events += OrderEvent.objects.filter(id__in=late).values(*EVENT_FIELDS)
+    return events
+
+
+def last_event_id(user_id=None):
+    events = OrderEvent.objects.all() if user_id is None else OrderEvent.objects.filter(user_id=user_id)
+    return events.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def _query(func, *args):
+    try:
+        return func(*args)
+    except DatabaseError:
+        connection.close() # следующий запрос откроет новое соединение
+        raise
+
+
+class EventPoller:
+    """
+    Общий опрос таблицы событий для всех потоков цикла событий (процесса ASGI-сервера): раз в POLL секунд один
+    запрос новых событий и один запрос событий за последние LAG секунд, которые зафиксировались позже событий
+    с большими id. События раскладываются по очередям подписанных потоков, число запросов к БД не зависит от числа
+    открытых потоков. Опрос запускается с первой подпиской и останавливается, когда подписчиков не остаётся.
+    Все запросы потоков событий, включая дочитывание истории при подключении, выполняются в собственном потоке
+    опроса, поэтому у процесса одно соединение с БД на все открытые потоки.
+    """
+
+    def __init__(self):
+        self.queues = {} # id пользователя -> очереди его потоков
+        self.after = None
+        self.seen = {} # id -> dt разосланных событий, ещё попадающих в окно LAG
+        self.task = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='order-events')
+
+    async def query(self, func, *args):
+        """Запрос к БД в потоке опроса (соединения Django принадлежат потоку)"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(_query, func, *args))
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue()
+        self.queues.setdefault(user_id, set()).add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self.queues.get(user_id, set())
+        queues.discard(queue)
+        if not queues:
+            self.queues.pop(user_id, None)
+
+    async def run(self):
+        config = events_settings()
+        while True:
+            while self.queues:
+                await self.poll(config)
+            self.after, self.seen = None, {}
+            await self.query(connection.close) # без подписчиков соединение не держим
+            if not self.queues: # за время закрытия мог подключиться новый поток
+                return
+
+    async def poll(self, config):
+        since = timezone.now() - timedelta(seconds=config['LAG'])
+        try:
+            if self.after is None:
+                self.after = await self.query(last_event_id)
+            events = await self.query(poll_events, self.after, since, set(self.seen), config['BATCH'] * 10)
+        except DatabaseError: # опрос продолжается, потоки тем временем отправляют пинги
+            await asyncio.sleep(config['POLL'])
+            return
+        for event in events:
+            self.seen[event['id']] = event['dt']
+            self.after = max(self.after, event['id'])
+            for queue in self.queues.get(event['user_id'], ()):
+                queue.put_nowait(event)
+        self.seen = {event_id: dt for event_id, dt in self.seen.items() if dt >= since}
+        if len(events) < config['BATCH'] * 10: # иначе есть ещё непрочитанные события, дочитываем без паузы
+            await asyncio.sleep(config['POLL'])
+
+
+_pollers = weakref.WeakKeyDictionary()
+
+
+def get_poller():
+    """Опрос событий текущего цикла событий: очереди asyncio привязаны к циклу, в котором созданы"""
+    loop = asyncio.get_running_loop()
+    if loop not in _pollers:
+        _pollers[loop] = EventPoller()
+    return _pollers[loop]
+
+
+def format_event(event, cursor):
+    """
+    Сообщение server-sent events. В id передаётся наибольший отправленный id, а не id события: поздно
+    зафиксированное событие не должно откатывать Last-Event-ID клиента назад.
+    """
+
+    data = {key: value for key, value in event.items() if key != 'user_id'}
+    return f'id: {cursor}\nevent: order\ndata: {dumps(dict(data, dt=data["dt"].isoformat()))}\n\n'
+
+
+async def event_stream(user_id, after):
+    """
+    Поток server-sent events: при подключении дочитываются события после after и поздно зафиксированные события
+    за окно LAG, затем события приходят от общего опроса процесса (EventPoller). При простое отправляется
+    комментарий-пинг, через MAX_AGE секунд поток закрывается и клиент переподключается с заголовком Last-Event-ID.
+    События из окна LAG при переподключении могут прийти повторно, клиент различает их по полю id.
+    """
+
+    config = events_settings()
+    started = last_sent = time.monotonic()
+    since = timezone.now() - timedelta(seconds=config['LAG'])
+    poller = get_poller()
+    queue = poller.subscribe(user_id) # подписка до чтения истории, чтобы не пропустить события между ними
+    sent, cursor = set(), after
+    try:
+        yield f'retry: {config["RETRY_MS"]}\n\n'
+        backlog = await poller.query(fetch_late, user_id, after, since)
+        while True:
+            events = await poller.query(fetch_events, user_id, cursor, config['BATCH'])
+            for event in backlog + events:
+                if event['id'] not in sent:
+                    sent.add(event['id'])
+                    cursor = max(cursor, event['id'])
+                    yield format_event(event, cursor)
+            backlog = []
+            if len(events) < config['BATCH']:
+                break
+        last_sent = time.monotonic()
+        while (left := config['MAX_AGE'] - (time.monotonic() - started)) > 0:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=min(left, config['HEARTBEAT']))
+            except asyncio.TimeoutError:
+                if time.monotonic() - last_sent >= config['HEARTBEAT']:
+                    last_sent = time.monotonic()
+                    yield ': ping\n\n'
+                continue
+            # события до курсора клиента старше окна LAG он уже получил в прошлом подключении
+            if event['id'] in sent or event['id'] <= after and event['dt'] < since:
+                continue
+            sent.add(event['id'])
+            cursor = max(cursor, event['id'])
+            last_sent = time.monotonic()
+            yield format_event(event, cursor)
+    finally:
+        poller.unsubscribe(user_id, queue)
@@ -0,0 +1,65 @@
+import hashlib
+from collections import namedtuple
+
+import yaml
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from .validation import check_feed
+
+# content равен None, если прайс не изменился с прошлой загрузки
+FeedResponse = namedtuple('FeedResponse', ['content', 'etag', 'last_modified', 'content_hash'])
+
+_session = None
+
+
+def get_session():
+    """
+    Общая HTTP-сессия с пулом соединений, чтобы повторные загрузки прайсов не открывали соединение заново
+    """
+
+    global _session
+    if _session is None:
+        _session = Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=2)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+    return _session
+
+
+def fetch_feed(url, etag='', last_modified='', content_hash='', timeout=30):
+    """
+    Условная загрузка прайса: отправляем If-None-Match/If-Modified-Since от прошлой загрузки, а если сервер их не
+    поддерживает, сравниваем хеш содержимого с хешем последнего успешного импорта.
+    """
+
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    response = get_session().get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return FeedResponse(None, etag, last_modified, content_hash)
+    response.raise_for_status()
+    content = response.content
+    digest = hashlib.sha256(content).hexdigest()
+    return FeedResponse(None if digest == content_hash else content, response.headers.get('ETag', ''),
+                        response.headers.get('Last-Modified', ''), digest)
+
+
+def parse_feed(content):
+    """Разбор YAML прайса (байты, строка или файл) безопасным загрузчиком, на C-реализации, если она доступна"""
+    return yaml.load(content, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+def parse_feed_file(path):
+    """
+    Чтение, разбор и проверка файла прайса. Не обращается к БД, поэтому подходит для запуска в пуле процессов;
+    прайс с ошибками отклоняется исключением FeedValidationError до импорта.
+    """
+
+    with open(path, 'rb') as file:
+        data = parse_feed(file)
+    check_feed(data)
+    return data
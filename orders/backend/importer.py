@@ -0,0 +1,106 @@
+from django.db import transaction
+
+from .autocomplete import rebuild_index_async
+from .baskets import basket_users, invalidate_baskets
+from .categories import refresh_product_counts, with_ancestors
+from .counters import apply_category_deltas, refresh_category_counters, refresh_shop_counters, \
+    shop_category_counts
+from .matching import ProductMatcher
+from .models import Category, Shop, ProductInfo, Product, Parameter, ProductParameter, ProductMatch
+from .singleflight import bump_catalog_version
+from .validation import FeedValidationError
+
+
+def shared_subtree(category, shop_id):
+    """Ветка категории используется другими магазинами: дерево категорий общее, такую ветку прайс не переносит"""
+    return Category.shops.through.objects.filter(category__path__startswith=category.path).exclude(
+        shop_id=shop_id).exists()
+
+
+def import_catalog(data, user_id=None, reindex=True):
+    """
+    Загрузка прайса магазина (разобранного YAML с ключами shop/categories/goods) в каталог.
+    Категория может ссылаться на родительскую через необязательный ключ parent. Переносятся только ветки,
+    которыми не пользуются другие магазины; перенос, замыкающий цикл через категории из БД, отклоняется
+    исключением FeedValidationError.
+    Общая логика для PartnerUpdate и команды import_feeds: прежние позиции магазина заменяются новыми,
+    всё выполняется в одной транзакции. reindex=False - индекс автодополнения пересобирает вызывающий.
+    Возвращает магазин и количество загруженных позиций.
+    """
+
+    with transaction.atomic():
+        shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=user_id)
+        shop = Shop.objects.select_for_update().get(id=shop.id) # блокировка против параллельного открытия/закрытия
+        if shop.opened: # прежние предложения магазина снимаем со счётчиков категорий до изменения дерева
+            apply_category_deltas(shop_category_counts(shop.id), sign=-1)
+        categories = {}
+        for category in data['categories']:
+            categories[category['id']], _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
+        shop.categories.add(*categories)
+        touched, moved = {item['category'] for item in data['goods']}, set()
+        moves = {number: category for number, category in enumerate(data['categories'], start=1)
+                 if 'parent' in category and category['parent'] != categories[category['id']].parent_id
+                 and not shared_subtree(categories[category['id']], shop.id)}
+        for category in moves.values(): # сначала отцепляем переносимые ветки, затем вешаем на новых родителей:
+            cat = categories[category['id']] # так порядок строк прайса не создаёт промежуточных циклов
+            moved |= with_ancestors([cat.id]) # счётчики прежних предков тоже нужно пересчитать
+            cat.parent_id = None
+            cat.save()
+        for number, category in moves.items():
+            cat = categories[category['id']]
+            cat.parent_id = category['parent']
+            try:
+                cat.save()
+            except ValueError: # цикл через категории, уже лежащие в БД: транзакция откатывается целиком
+                raise FeedValidationError(
+                    {f'categories[{number}]': [f'Категория {cat.id} оказалась бы вложена в собственную подкатегорию']},
+                    {'categories': len(data['categories']), 'goods': len(data['goods']), 'errors': 1})
+        if moved: # новые предки перенесённых категорий (пути могли смениться и при переносе их предков)
+            moved |= with_ancestors(moved)
+            touched |= moved
+        users = basket_users(shop_id=shop.id) # прежние предложения удаляются вместе с позициями корзин
+        indexed = set(ProductInfo.objects.filter(shop_id=shop.id).values_list('product_id', flat=True))
+        ProductInfo.objects.filter(shop_id=shop.id).delete()
+        # позиции связываются с уже известными товарами по точному или нечёткому совпадению названия и модели,
+        # для остальных заводятся новые товары, сомнительные совпадения попадают в очередь проверки
+        matcher = ProductMatcher({item['category'] for item in data['goods']}, len(data['goods']))
+        products, created = {}, {}
+        for item in data['goods']:
+            key = (item['name'], item['category'])
+            if key not in products and key not in created:
+                product_id, candidate_id, score = matcher.match(item['name'], item['category'], item.get('model'))
+                if product_id:
+                    products[key] = product_id
+                else:
+                    created[key] = (Product(name=item['name'], category_id=item['category']), candidate_id, score,
+                                    item.get('model'))
+        Product.objects.bulk_create([product for product, *_ in created.values()])
+        products.update({key: product.id for key, (product, *_) in created.items()})
+        ProductMatch.objects.bulk_create([
+            ProductMatch(shop_id=shop.id, category_id=key[1], name=key[0], model=str(model or '')[:80],
+                         product_id=product.id, candidate_id=candidate_id, score=score)
+            for key, (product, candidate_id, score, model) in created.items() if candidate_id], ignore_conflicts=True)
+        infos = ProductInfo.objects.bulk_create([
+            ProductInfo(product_id=products[(item['name'], item['category'])], external_id=item['id'],
+                        model=item.get('model'), price=item['price'], price_rrc=item['price_rrc'],
+                        quantity=item['quantity'], shop_id=shop.id)
+            for item in data['goods']])
+        names = {name for item in data['goods'] for name in item.get('parameters', {})}
+        parameters = dict(Parameter.objects.filter(name__in=names).values_list('name', 'id'))
+        for name in names - parameters.keys():
+            parameters[name] = Parameter.objects.create(name=name).id
+        ProductParameter.objects.bulk_create([
+            ProductParameter(product_info_id=info.id, parameter_id=parameters[name], value=value)
+            for info, item in zip(infos, data['goods']) for name, value in item.get('parameters', {}).items()])
+        refresh_product_counts(touched)
+        if shop.opened:
+            apply_category_deltas(shop_category_counts(shop.id))
+        if moved: # предложения других магазинов в перенесённых поддеревьях учтены под прежними предками
+            refresh_category_counters(moved)
+        refresh_shop_counters(shop.id)
+        transaction.on_commit(lambda: invalidate_baskets(users))
+        indexed |= {info.product_id for info in infos}
+        if reindex:
+            transaction.on_commit(lambda: rebuild_index_async(indexed)) # товары магазина в индексе автодополнения
+        transaction.on_commit(bump_catalog_version)
+    return shop, len(infos)
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from backend.archive import archive_orders, purge_baskets
+from backend.events import purge_events
+
+
+class Command(BaseCommand):
+    """
+    Архивация старых заказов, очистка брошенных корзин и старых событий заказов.
+    Предназначена для запуска по расписанию (cron).
+    """
+
+    help = 'Переносит старые исполненные/отменённые заказы в архив, удаляет брошенные корзины и старые события заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Возраст заказа в днях для переноса в архив')
+        parser.add_argument('--basket-days', type=int, default=90, help='Возраст корзины в днях для удаления')
+        parser.add_argument('--event-days', type=int, default=7, help='Возраст событий заказов в днях для удаления')
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество заказов в одной транзакции')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        archived = archive_orders(now - timedelta(days=options['days']), options['batch_size'])
+        self.stdout.write(f'Перенесено в архив заказов: {archived}')
+        purged = purge_baskets(now - timedelta(days=options['basket_days']), options['batch_size'])
+        self.stdout.write(f'Удалено брошенных корзин: {purged}')
+        events = purge_events(now - timedelta(days=options['event_days']), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено событий заказов: {events}'))
@@ -0,0 +1,53 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from backend.analytics import apply_shipments
+from backend.models import OrderArchive, Shipment, ShopSalesRollup, ProductSalesRollup, SALE_STATUSES
+
+
+class Command(BaseCommand):
+    """
+    Пересборка витрин продаж по историческим заказам.
+    Очистка и пересборка идут в одной транзакции с заблокированными на запись таблицами витрин: оформления и отмены,
+    пришедшие во время пересборки, ждут её окончания и прибавляются к уже пересобранным строкам, а не теряются
+    при очистке и не учитываются дважды. Отправления учитываются порциями по возрастанию id.
+    Дни до последнего архивного заказа включительно не пересобираются: позиций архивных заказов в рабочих
+    таблицах уже нет, и их выручка сохранилась только в витринах.
+    """
+
+    help = 'Пересобирает витрины продаж магазинов по историческим заказам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Количество отправлений в одной порции')
+
+    def handle(self, *args, **options):
+        shipments = Shipment.objects.filter(status__in=SALE_STATUSES).order_by('id')
+        rollups = [ShopSalesRollup.objects.all(), ProductSalesRollup.objects.all()]
+        archived = OrderArchive.objects.aggregate(last=Max('dt'))['last']
+        if archived:
+            since = timezone.localdate(archived) + timedelta(days=1)
+            shipments = shipments.filter(order__dt__gte=timezone.make_aware(datetime.combine(since, time.min)))
+            rollups = [queryset.filter(day__gte=since) for queryset in rollups]
+            self.stdout.write(f'Витрины по {since - timedelta(days=1)} включительно содержат архивные заказы '
+                              f'и не пересобираются')
+        last_id, processed = 0, 0
+        with transaction.atomic():
+            if connection.vendor == 'postgresql': # чтение отчётов не блокируется, запись в витрины ждёт
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LOCK TABLE {ShopSalesRollup._meta.db_table}, '
+                                   f'{ProductSalesRollup._meta.db_table} IN EXCLUSIVE MODE')
+            for queryset in rollups:
+                queryset.delete()
+            while True:
+                chunk = list(shipments.filter(id__gt=last_id).values_list('id', flat=True)[:options['chunk_size']])
+                if not chunk:
+                    break
+                apply_shipments(chunk)
+                last_id = chunk[-1]
+                processed += len(chunk)
+                self.stdout.write(f'Обработано отправлений: {processed} (последний id {last_id})')
+        self.stdout.write(self.style.SUCCESS(f'Витрины продаж пересобраны, учтено отправлений: {processed}'))
@@ -0,0 +1,63 @@
+import gzip
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from backend.middleware import brotli
+from backend.renderers import CompactJSONRenderer, MessagePackRenderer, msgpack
+
+
+def sample_catalog(rows):
+    """Синтетический каталог в формате ProductInfoSerializer"""
+    return [{
+        'id': index,
+        'model': f'apple/iphone/model-{index % 50}',
+        'product': {'id': index // 3, 'name': f'Смартфон Apple iPhone {index % 17} 256GB', 'category': 'Смартфоны'},
+        'shop': index % 7,
+        'quantity': index % 20,
+        'price': 50000 + index * 7,
+        'price_rrc': 60000 + index * 7,
+        'product_parameters': [
+            {'parameter': 'Диагональ (дюйм)', 'value': '6.5'},
+            {'parameter': 'Разрешение (пикс)', 'value': '2688x1242'},
+            {'parameter': 'Цвет', 'value': 'золотистый'},
+        ],
+    } for index in range(rows)]
+
+
+class Command(BaseCommand):
+    """
+    Сравнение размеров ответа и времени кодирования для форматов JSON, колоночного JSON и MessagePack
+    без сжатия, с gzip и brotli
+    """
+
+    help = 'Замеряет размер и время кодирования ответа каталога в разных форматах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Количество товаров в ответе')
+        parser.add_argument('--repeat', type=int, default=20, help='Количество повторов замера')
+
+    def measure(self, func, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - started)
+        return result, best * 1000
+
+    def handle(self, *args, **options):
+        data = sample_catalog(options['rows'])
+        formats = {'json': JSONRenderer(), 'compact': CompactJSONRenderer()}
+        if msgpack:
+            formats['msgpack'] = MessagePackRenderer()
+        compressors = {'-': None, 'gzip': lambda body: gzip.compress(body, compresslevel=6, mtime=0)}
+        if brotli:
+            compressors['br'] = lambda body: brotli.compress(body, quality=5)
+        self.stdout.write(f'{"формат":<10}{"сжатие":<8}{"байт":>10}{"кодирование, мс":>18}{"сжатие, мс":>14}')
+        for name, renderer in formats.items():
+            body, encode_ms = self.measure(lambda: renderer.render(data), options['repeat'])
+            for encoding, compress in compressors.items():
+                packed, compress_ms = self.measure(lambda: compress(body), options['repeat']) if compress else (
+                    body, 0.0)
+                self.stdout.write(f'{name:<10}{encoding:<8}{len(packed):>10}{encode_ms:>18.2f}{compress_ms:>14.2f}')
@@ -0,0 +1,83 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Код дочернего процесса: холодный старт WSGI-приложения и два запроса подряд
+CHILD = '''
+import json, os, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'orders.settings')
+from orders.wsgi import application
+booted = time.perf_counter()
+from backend.warmup import wsgi_request
+status, first = wsgi_request(application, sys.argv[1])
+_, second = wsgi_request(application, sys.argv[1])
+print(json.dumps({'boot': (booted - started) * 1000, 'first': first, 'second': second, 'status': status,
+                  'ttfr': (time.perf_counter() - started) * 1000 - second}))
+'''
+
+
+def parse_importtime(output):
+    """Строки -X importtime: {модуль: (собственное время, накопленное время)} в микросекундах"""
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(own), int(cumulative))
+    return modules
+
+
+class Command(BaseCommand):
+    """
+    Профиль холодного старта процесса сервера: разбивка времени импорта по пакетам (python -X importtime),
+    время загрузки orders.wsgi и время до первого ответа (time-to-first-request) в свежем процессе
+    """
+
+    help = 'Замеряет время старта рабочего процесса и время до первого ответа'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/v1/market/categories', help='Адрес первого запроса')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество запусков процесса')
+        parser.add_argument('--top', type=int, default=15, help='Сколько самых медленных пакетов показать')
+        parser.add_argument('--output', help='Файл JSON для сохранения результатов (для сравнения между сборками)')
+
+    def run_child(self, path, importtime=False):
+        command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', CHILD, path]
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'orders.settings'))
+        result = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f'Процесс завершился с ошибкой:\n{result.stderr[-2000:]}')
+        return json.loads(result.stdout.splitlines()[-1]), result.stderr
+
+    def handle(self, *args, **options):
+        _, stderr = self.run_child(options['path'], importtime=True)
+        modules = parse_importtime(stderr)
+        packages = defaultdict(int)
+        for name, (own, _) in modules.items():
+            packages[name.partition('.')[0]] += own
+        total = sum(packages.values())
+        self.stdout.write(f'Импорт: модулей {len(modules)}, {total / 1000:.1f} мс')
+        self.stdout.write(f'{"пакет":<32}{"мс":>10}{"доля":>8}')
+        for name, own in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'{name:<32}{own / 1000:>10.1f}{own / total:>8.1%}')
+
+        runs = [self.run_child(options['path'])[0] for _ in range(options['repeat'])]
+        result = {key: round(statistics.median(run[key] for run in runs), 1)
+                  for key in ('boot', 'first', 'second', 'ttfr')}
+        result.update(path=options['path'], status=runs[0]['status'], repeat=options['repeat'],
+                      imports_ms=round(total / 1000, 1), packages={name: round(own / 1000, 1) for name, own in
+                                                                   packages.items() if own >= 1000})
+        self.stdout.write(self.style.SUCCESS(
+            f'Медиана по {options["repeat"]} запускам: загрузка приложения {result["boot"]} мс, первый запрос '
+            f'{result["first"]} мс (повторный {result["second"]} мс), до первого ответа {result["ttfr"]} мс, '
+            f'код ответа {result["status"]}'))
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(result, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.recommendations import update_related, sparse
+
+
+class Command(BaseCommand):
+    """
+    Пересчёт рекомендаций «часто покупают вместе» по исполненным заказам.
+    Предназначена для запуска по расписанию (cron): учитываются только заказы, исполненные после прошлого запуска.
+    """
+
+    help = 'Обновляет матрицу совместных покупок и топ сопутствующих товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help='Сколько сопутствующих товаров хранить на товар')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество заказов в одной порции')
+        parser.add_argument('--full', action='store_true', help='Пересчитать по всем исполненным заказам')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        orders, products = update_related(options['top'], options['batch_size'], options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Учтено заказов: {orders}, обновлено товаров: {products}, время: {time.monotonic() - started:.1f} с '
+            f'({"scipy" if sparse else "без scipy"})'))
@@ -0,0 +1,149 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+
+from backend.autocomplete import rebuild_index
+from backend.feeds import parse_feed_file
+from backend.importer import import_catalog
+from backend.models import User
+
+
+class Command(BaseCommand):
+    """
+    Массовая загрузка прайсов из файлов.
+    Файлы разбираются в пуле процессов, разобранные прайсы через ограниченную очередь попадают к потокам записи в БД,
+    каждый магазин загружается в своей транзакции той же логикой, что и в PartnerUpdate. Загруженные файлы
+    отмечаются в файле контрольных точек, повторный запуск продолжает с места остановки. Индекс автодополнения
+    пересобирается один раз в конце загрузки.
+    """
+
+    help = 'Загружает прайсы магазинов из каталога с YAML-файлами или из манифеста'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Каталог с *.yaml/*.yml или JSON-манифест [{"file": ..., "user": email}]')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Процессов для разбора файлов')
+        parser.add_argument('--writers', type=int, default=2, help='Потоков записи в БД')
+        parser.add_argument('--queue-size', type=int, default=8, help='Размер очереди разобранных прайсов')
+        parser.add_argument('--checkpoint', help='Файл контрольных точек (по умолчанию рядом с источником)')
+        parser.add_argument('--restart', action='store_true', help='Игнорировать контрольные точки')
+        parser.add_argument('--retries', type=int, default=3,
+                            help='Повторов загрузки магазина после ошибки БД (взаимной блокировки)')
+
+    def handle(self, *args, **options):
+        source = Path(options['source'])
+        feeds = self.read_source(source)
+        checkpoint_path = Path(options['checkpoint'] or (
+            source / '.import_checkpoint.json' if source.is_dir() else source.with_suffix('.checkpoint.json')))
+        checkpoint = {}
+        if checkpoint_path.exists() and not options['restart']:
+            checkpoint = json.loads(checkpoint_path.read_text())
+        pending = [(path, user_id) for path, user_id in feeds if checkpoint.get(str(path)) != self.signature(path)]
+        self.stdout.write(f'Прайсов: {len(feeds)}, уже загружено: {len(feeds) - len(pending)}')
+
+        lock = threading.Lock()
+        stats = {'feeds': 0, 'goods': 0, 'errors': 0}
+        parsed = queue.Queue(maxsize=options['queue_size'])
+
+        def save(path, result):
+            with lock:
+                if isinstance(result, Exception):
+                    stats['errors'] += 1
+                    self.stderr.write(f'{path}: ошибка загрузки: {result}')
+                    return
+                stats['feeds'] += 1
+                stats['goods'] += result
+                checkpoint[str(path)] = self.signature(path)
+                temp = checkpoint_path.with_suffix('.tmp')
+                temp.write_text(json.dumps(checkpoint, ensure_ascii=False))
+                os.replace(temp, checkpoint_path)
+                self.stdout.write(f'[{stats["feeds"] + stats["errors"]}/{len(pending)}] {path}: позиций {result}')
+
+        def writer():
+            try:
+                while (task := parsed.get()) is not None:
+                    path, user_id, data = task
+                    if isinstance(data, Exception):
+                        save(path, data)
+                        continue
+                    save(path, self.import_feed(data, user_id, options['retries']))
+            finally:
+                connections.close_all()
+
+        started = time.monotonic()
+        connections.close_all() # дочерние процессы не должны наследовать соединения с БД
+        writers = [threading.Thread(target=writer) for _ in range(options['writers'])]
+        for thread in writers:
+            thread.start()
+        window = options['workers'] + options['queue_size'] # не разбираем больше, чем успеваем записать
+        try:
+            with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+                tasks, in_flight = iter(pending), {}
+                while True:
+                    for path, user_id in tasks:
+                        in_flight[pool.submit(parse_feed_file, path)] = (path, user_id)
+                        if len(in_flight) >= window:
+                            break
+                    if not in_flight:
+                        break
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path, user_id = in_flight.pop(future)
+                        parsed.put((path, user_id, future.exception() or future.result()))
+        finally:
+            for _ in writers:
+                parsed.put(None)
+            for thread in writers:
+                thread.join()
+        if stats['feeds']: # фоновые потоки пересборки не пережили бы завершения команды
+            rebuild_index()
+            self.stdout.write('Индекс автодополнения пересобран')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено прайсов: {stats["feeds"]}, позиций: {stats["goods"]}, ошибок: {stats["errors"]}, '
+            f'время: {elapsed:.1f} с, {stats["feeds"] / elapsed:.2f} прайсов/с, '
+            f'{stats["goods"] / elapsed:.0f} позиций/с'))
+
+    @staticmethod
+    def import_feed(data, user_id, retries):
+        """
+        Загрузка одного прайса. Транзакция магазина, прерванная взаимной блокировкой с параллельной загрузкой
+        (OperationalError), откатывается целиком и повторяется с паузой. Возвращает число позиций или исключение:
+        ошибка одного прайса не должна останавливать загрузку остальных.
+        """
+
+        for attempt in range(retries + 1):
+            try:
+                return import_catalog(data, user_id, reindex=False)[1]
+            except OperationalError as err:
+                if attempt == retries:
+                    return err
+                time.sleep(0.1 * 2 ** attempt)
+            except Exception as err:
+                return err
+
+    @staticmethod
+    def signature(path):
+        stat = path.stat()
+        return f'{stat.st_size}:{stat.st_mtime_ns}'
+
+    @staticmethod
+    def read_source(source):
+        """Список (файл, id продавца) из каталога или манифеста"""
+        if source.is_dir():
+            return [(path, None) for path in sorted(source.iterdir()) if path.suffix in ('.yaml', '.yml')]
+        if not source.exists():
+            raise CommandError(f'Источник {source} не найден')
+        manifest = json.loads(source.read_text())
+        emails = {entry['user'] for entry in manifest if entry.get('user')}
+        users = dict(User.objects.filter(email__in=emails).values_list('email', 'id'))
+        if emails - users.keys():
+            raise CommandError(f'Не найдены продавцы: {", ".join(sorted(emails - users.keys()))}')
+        return [((source.parent / entry['file']).resolve(), users.get(entry.get('user'))) for entry in manifest]
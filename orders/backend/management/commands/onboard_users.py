@@ -0,0 +1,36 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.onboarding import onboard_users, USER_FIELDS
+
+
+class Command(BaseCommand):
+    """
+    Массовая регистрация покупателей B2B-клиента из CSV вместо поштучных вызовов user/register
+    """
+
+    help = 'Регистрирует пользователей из CSV (first_name,last_name,username,email,password,phone[,type])'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='CSV-файл с заголовком')
+        parser.add_argument('--workers', type=int, help='Процессов для хеширования паролей (по умолчанию по ядрам)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Строк в одном INSERT')
+        parser.add_argument('--email-batch-size', type=int, default=100, help='Писем на одно SMTP-соединение')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['file'], newline='', encoding='utf-8-sig') as file:
+                rows = list(csv.DictReader(file))
+        except OSError as err:
+            raise CommandError(str(err))
+        if rows and not set(USER_FIELDS).issubset(rows[0]):
+            raise CommandError(f'В заголовке CSV должны быть поля: {", ".join(USER_FIELDS)}')
+        started = time.monotonic()
+        created, errors = onboard_users(rows, options['workers'], options['batch_size'], options['email_batch_size'])
+        for number, error in sorted(errors.items()):
+            self.stderr.write(f'Строка {number}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Зарегистрировано пользователей: {created}, с ошибками: {len(errors)}, '
+            f'время: {time.monotonic() - started:.1f} с'))
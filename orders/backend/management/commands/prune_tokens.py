@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from backend.tokens import prune_expired, table_sizes
+
+
+class Command(BaseCommand):
+    """
+    Очистка просроченных токенов подтверждения почты, входа и сброса пароля.
+    Предназначена для запуска по расписанию (cron).
+    """
+
+    help = 'Удаляет просроченные токены небольшими порциями и выводит размеры таблиц и скорость очистки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество токенов в одном DELETE')
+        parser.add_argument('--pause', type=float, default=0.05, help='Пауза между порциями, секунд')
+
+    def handle(self, *args, **options):
+        sizes = table_sizes()
+        stats = prune_expired(options['batch_size'], options['pause'])
+        after = table_sizes()
+        for kind, result in stats.items():
+            self.stdout.write(f'{kind}: строк было {sizes[kind]}, стало {after[kind]}, удалено {result["deleted"]} '
+                              f'за {result["seconds"]} с ({result["rate"]} строк/с)')
+        self.stdout.write(self.style.SUCCESS(f'Удалено токенов: {sum(item["deleted"] for item in stats.values())}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    """
+    Сверка счётчиков каталога с фактическими данными на случай расхождений после ручных правок в админке
+    """
+
+    help = 'Пересчитывает счётчики предложений магазинов и категорий и количество товаров в категориях'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_counters()
+        self.stdout.write(self.style.SUCCESS('Счётчики каталога пересчитаны'))
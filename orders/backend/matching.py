@@ -0,0 +1,211 @@
+import re
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .autocomplete import rebuild_index_async
+from .baskets import basket_users, invalidate_baskets
+from .categories import refresh_product_counts, with_ancestors
+from .counters import refresh_category_counters
+from .models import Product, ProductInfo, ProductMatch, ProductSalesRollup
+from .singleflight import bump_catalog_version
+
+re_not_word = re.compile(r'[\W_]+')
+UNITS = {'гб': 'gb', 'тб': 'tb', 'мб': 'mb', 'гц': 'hz', 'мп': 'mp', 'вт': 'w', 'мм': 'mm', 'дюйм': 'in'}
+# слова, которыми названия одного товара в разных прайсах могут различаться
+STOP_WORDS = frozenset({'и', 'в', 'во', 'с', 'со', 'для', 'на', 'по', 'из', 'от', 'без', 'новый', 'new', 'and', 'for',
+                        'with', 'the'})
+
+
+def matching_settings():
+    config = {'REVIEW': 0.45, 'CANDIDATES': 50, 'BUDGET': 2.0}
+    config.update(getattr(settings, 'PRODUCT_MATCHING', {}))
+    return config
+
+
+def normalize(text):
+    """Приводим название или модель к виду для сравнения: регистр, ё, знаки, единицы измерения, «256gb» -> «256 gb»"""
+    text = re_not_word.sub(' ', str(text or '').lower().replace('ё', 'е'))
+    text = re.sub(r'(\d)([^\W\d]+)', r'\1 \2', text)
+    return ' '.join(UNITS.get(word, word) for word in text.split())
+
+
+def tokens(text):
+    """Значимые слова нормализованного названия: порядок и стоп-слова не учитываются"""
+    return frozenset(text.split()) - STOP_WORDS
+
+
+def trigrams(text):
+    """Триграммы слов как в pg_trgm: каждое слово дополняется двумя пробелами в начале и одним в конце"""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[position:position + 3] for position in range(len(padded) - 2))
+    return grams
+
+
+def similarity(first, second):
+    """Коэффициент Жаккара по множествам триграмм"""
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+class ProductMatcher:
+    """
+    Сопоставление позиций прайса с товарами каталога в категориях прайса.
+    Кандидаты отбираются по блокирующему индексу (категория, слово): берутся самые редкие слова названия и модели,
+    пока не наберётся CANDIDATES товаров, и сравниваются по сходству триграмм. Автоматически позиция связывается
+    с товаром только при совпадении нормализованной модели или значимых слов названия (различаются лишь порядок,
+    регистр, знаки, запись единиц и стоп-слова): высокое сходство бывает и у разных товаров («iPhone XR»
+    и «iPhone XS», «Galaxy S10» и «Galaxy S10 Plus», разные цвета). Остальные позиции со сходством не ниже
+    REVIEW отправляются на проверку, ниже - заводятся новыми товарами. На сопоставление отводится BUDGET секунд
+    на 10 тысяч позиций, после исчерпания остаток прайса сопоставляется только по точному названию.
+    """
+
+    def __init__(self, category_ids, rows):
+        self.config = matching_settings()
+        self.stats = {'exact': 0, 'matched': 0, 'review': 0, 'new': 0, 'fallback': 0}
+        self.exact, self.products, self.blocks = {}, {}, {}
+        names = list(Product.objects.filter(category_id__in=category_ids).order_by('-id').values_list(
+            'id', 'name', 'category_id'))
+        models = {}
+        for product_id, model in ProductInfo.objects.filter(product__category_id__in=category_ids).exclude(
+                model__isnull=True).exclude(model='').values_list('product_id', 'model').distinct():
+            models.setdefault(product_id, set()).add(normalize(model))
+        for product_id, name, category_id in names:
+            self.exact[(name, category_id)] = product_id # при дубликатах остаётся самый ранний товар
+            text, product_models = normalize(name), models.get(product_id, set())
+            self.products[product_id] = (trigrams(text), tokens(text), product_models)
+            for word in {*text.split(), *(word for model in product_models for word in model.split())}:
+                self.blocks.setdefault((category_id, word), []).append(product_id)
+        self.decisions = {}
+        for name, category_id, candidate_id, state in ProductMatch.objects.filter(
+                category_id__in=category_ids).exclude(state='new').values_list(
+                'name', 'category_id', 'candidate_id', 'state'):
+            self.decisions[(name, category_id, candidate_id)] = state
+            if state == 'accepted':
+                self.decisions[(name, category_id)] = candidate_id
+        # бюджет считается от начала сопоставления, прайсам меньше 10 тысяч позиций отводится как на 10 тысяч
+        self.deadline = time.monotonic() + self.config['BUDGET'] * max(rows, 10000) / 10000
+
+    def candidates(self, category_id, words):
+        """Товары из блоков самых редких слов, не больше CANDIDATES (из самого редкого блока - первые CANDIDATES)"""
+        limit = self.config['CANDIDATES']
+        found = set()
+        for block in sorted((self.blocks.get((category_id, word), ()) for word in words), key=len):
+            if not block:
+                continue
+            if found and len(found) + len(block) > limit:
+                break
+            found.update(block[:limit])
+        return found
+
+    def match(self, name, category_id, model=''):
+        """
+        Товар каталога для позиции: (id товара или None, кандидат на проверку или None, сходство).
+        None означает, что для позиции нужно завести новый товар.
+        """
+
+        accepted = self.decisions.get((name, category_id))
+        if accepted:
+            self.stats['matched'] += 1
+            return accepted, None, 1.0
+        if (name, category_id) in self.exact:
+            self.stats['exact'] += 1
+            return self.exact[(name, category_id)], None, 1.0
+        if time.monotonic() > self.deadline:
+            self.stats['fallback'] += 1
+            return None, None, 0.0
+        text, model = normalize(name), normalize(model)
+        grams, words = trigrams(text), tokens(text)
+        best, best_key = None, (False, False, 0.0)
+        for product_id in self.candidates(category_id, {*text.split(), *model.split()}):
+            product_grams, product_words, product_models = self.products[product_id]
+            key = (bool(model) and model in product_models, bool(words) and words == product_words,
+                   similarity(grams, product_grams))
+            if key > best_key:
+                best, best_key = product_id, key
+        same_model, same_words, best_score = best_key
+        if best is None or self.decisions.get((name, category_id, best)) == 'rejected':
+            self.stats['new'] += 1
+            return None, None, best_score
+        if same_model or same_words:
+            self.stats['matched'] += 1
+            return best, None, best_score
+        if best_score < self.config['REVIEW']:
+            self.stats['new'] += 1
+            return None, None, best_score
+        self.stats['review'] += 1
+        return None, best, best_score
+
+
+def merge_sales(product_id, target_id):
+    """Дневные продажи товара прибавляются к продажам target_id за тот же день в том же магазине или переносятся"""
+    rollups = list(ProductSalesRollup.objects.filter(product_id=product_id))
+    existing = {(rollup.shop_id, rollup.day): rollup for rollup in ProductSalesRollup.objects.filter(
+        product_id=target_id, shop_id__in={rollup.shop_id for rollup in rollups},
+        day__in={rollup.day for rollup in rollups})}
+    merged = []
+    for rollup in rollups:
+        target = existing.get((rollup.shop_id, rollup.day))
+        if target:
+            target.revenue += rollup.revenue
+            target.units += rollup.units
+            target.orders_count += rollup.orders_count
+            merged.append(rollup.id)
+    ProductSalesRollup.objects.bulk_update(existing.values(), ['revenue', 'units', 'orders_count'])
+    ProductSalesRollup.objects.filter(id__in=merged).delete()
+    ProductSalesRollup.objects.filter(product_id=product_id).update(product_id=target_id)
+
+
+def resolve_match(match_id, accept):
+    """
+    Решение по совпадению из очереди. При подтверждении позиции всех магазинов, заведённые под отдельным товаром,
+    и его продажи переносятся на товар-кандидат, опустевший товар удаляется, счётчики категорий пересчитываются.
+    Возвращает решение; 'conflict', если у кандидата уже есть позиция того же магазина с тем же external_id
+    (совпадение остаётся в очереди); None, если совпадение не найдено или уже проверено.
+    """
+
+    with transaction.atomic():
+        match = ProductMatch.objects.select_for_update().filter(id=match_id, state='new').first()
+        if match is None:
+            return None
+        product_id, candidate_id = match.product_id, match.candidate_id
+        infos = ProductInfo.objects.filter(product_id=product_id)
+        if accept and set(infos.values_list('shop_id', 'external_id')) & set(ProductInfo.objects.filter(
+                product_id=candidate_id).values_list('shop_id', 'external_id')):
+            return 'conflict'
+        match.state = 'accepted' if accept else 'rejected'
+        match.save()
+        if accept:
+            categories = set(Product.objects.filter(id__in=(product_id, candidate_id)).values_list(
+                'category_id', flat=True))
+            moved = list(infos.values_list('id', flat=True))
+            users = basket_users(product_info_ids=moved)
+            infos.update(product_id=candidate_id)
+            merge_sales(product_id, candidate_id)
+            ProductMatch.objects.filter(product_id=product_id, state='new').exclude(id=match.id).delete()
+            # подтверждённые решения с удаляемым товаром-кандидатом переходят на новый кандидат
+            for decision in ProductMatch.objects.filter(candidate_id=product_id, state='accepted'):
+                if not ProductMatch.objects.filter(category_id=decision.category_id, name=decision.name,
+                                                   candidate_id=candidate_id).exists():
+                    decision.candidate_id = candidate_id
+                    decision.save(update_fields=['candidate'])
+            Product.objects.filter(id=product_id, product_info__isnull=True).delete()
+            refresh_product_counts(categories)
+            if len(categories) > 1: # предложения перешли в другую категорию
+                refresh_category_counters(with_ancestors(categories))
+            transaction.on_commit(lambda: invalidate_baskets(users))
+            transaction.on_commit(lambda: rebuild_index_async({product_id, candidate_id}))
+            transaction.on_commit(bump_catalog_version)
+    return match.state
+
+
+def pending_matches(category_id=None, limit=100):
+    matches = ProductMatch.objects.filter(state='new')
+    if category_id:
+        matches = matches.filter(category_id=category_id)
+    return list(matches.values('id', 'shop_id', 'category_id', 'name', 'model', 'product_id', 'candidate_id',
+                               'candidate__name', 'score', 'dt')[:limit])
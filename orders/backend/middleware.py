@@ -0,0 +1,199 @@
+import cProfile
+import gzip
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import resolve, Resolver404
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import ExpiringTokenAuthentication
+from .profiling import profiling_settings, save_profile
+
+try:
+    import brotli
+except ImportError: # необязательная зависимость, без неё ответы сжимаются только gzip
+    brotli = None
+
+re_accepts_br = re.compile(r'\bbr\b')
+re_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+class Gate:
+    """
+    Ограничение одновременных запросов к одному адресу: limit выполняются, до queue ждут не дольше timeout секунд,
+    остальные сразу получают отказ. Счётчики ведутся в пределах процесса.
+    """
+
+    def __init__(self, limit, queue=0, timeout=1.0):
+        self.limit, self.queue, self.timeout = limit, queue, timeout
+        self.semaphore = threading.BoundedSemaphore(limit)
+        self.lock = threading.Lock()
+        self.active = self.waiting = 0
+        self.admitted = self.rejected = self.timeouts = self.peak_waiting = 0
+
+    def enter(self):
+        if not self.semaphore.acquire(blocking=False):
+            with self.lock:
+                if self.waiting >= self.queue:
+                    self.rejected += 1
+                    return False
+                self.waiting += 1
+                self.peak_waiting = max(self.peak_waiting, self.waiting)
+            acquired = self.semaphore.acquire(timeout=self.timeout)
+            with self.lock:
+                self.waiting -= 1
+                if not acquired:
+                    self.timeouts += 1
+                    return False
+        with self.lock:
+            self.active += 1
+            self.admitted += 1
+        return True
+
+    def leave(self):
+        with self.lock:
+            self.active -= 1
+        self.semaphore.release()
+
+    def stats(self):
+        with self.lock:
+            return {'limit': self.limit, 'queue': self.queue, 'active': self.active, 'waiting': self.waiting,
+                    'admitted': self.admitted, 'rejected': self.rejected, 'timeouts': self.timeouts,
+                    'peak_waiting': self.peak_waiting}
+
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def get_gates():
+    """Ограничители по именам адресов из settings.ADMISSION_CONTROL"""
+    if not _gates:
+        with _gates_lock:
+            if not _gates:
+                for name, config in getattr(settings, 'ADMISSION_CONTROL', {}).items():
+                    _gates[name] = Gate(config['limit'], config.get('queue', 0), config.get('timeout', 1.0))
+    return _gates
+
+
+class AdmissionControlMiddleware:
+    """
+    Контроль допуска запросов: тяжёлые адреса (импорт прайсов, заказы продавцов) не могут занять все потоки
+    сервера и соединения с БД. При перегрузке запрос быстро отклоняется с 503 и заголовком Retry-After.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.retry_after = str(getattr(settings, 'ADMISSION_RETRY_AFTER', 1))
+
+    def __call__(self, request):
+        gate = None
+        gates = get_gates()
+        if gates:
+            try:
+                gate = gates.get(resolve(request.path_info).url_name)
+            except Resolver404:
+                pass
+        if gate is None:
+            return self.get_response(request)
+        if not gate.enter():
+            return JsonResponse({'Status': False, 'Error': 'Сервер перегружен, повторите запрос позже'},
+                                status=503, headers={'Retry-After': self.retry_after})
+        try:
+            return self.get_response(request)
+        finally:
+            gate.leave()
+
+
+class CompressionMiddleware:
+    """
+    Сжатие ответов brotli (если установлен пакет brotli) или gzip. Ответы меньше COMPRESSION_MIN_SIZE байт
+    не сжимаются: на мелких ответах выигрыш меньше затрат.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.gzip_level = getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6)
+        self.brotli_quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding') or len(response.content) < self.min_size:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli and re_accepts_br.search(accept):
+            content, encoding = brotli.compress(response.content, quality=self.brotli_quality), 'br'
+        elif re_accepts_gzip.search(accept):
+            content, encoding = gzip.compress(response.content, compresslevel=self.gzip_level, mtime=0), 'gzip'
+        else:
+            return response
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'): # сжатое тело уже не совпадает побайтно с исходным
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+_profile_lock = threading.Lock()
+
+
+class ProfilingMiddleware:
+    """
+    Выборочное профилирование запросов через cProfile. Профилируется доля SAMPLE_RATE запросов и любой запрос
+    сотрудника с заголовком X-Profile, сохраняются профили медленнее SLOW_MS (запрошенные заголовком - всегда).
+    В процессе одновременно активен только один профилировщик (с Python 3.12 второй вызывает ValueError), поэтому
+    запрос, пересёкшийся с уже профилируемым, выполняется без профилирования.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = profiling_settings()
+        self.sample_rate, self.slow_ms = config['SAMPLE_RATE'], config['SLOW_MS']
+        self.header = 'HTTP_' + config['HEADER'].upper().replace('-', '_')
+
+    def forced(self, request):
+        """Заголовок учитывается только для сотрудников, чтобы профилированием нельзя было нагрузить сервер"""
+        if self.header not in request.META:
+            return False
+        try:
+            user_auth = ExpiringTokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return bool(user_auth and user_auth[0].is_staff)
+
+    def __call__(self, request):
+        forced = self.forced(request)
+        if not forced and (not self.sample_rate or random.random() >= self.sample_rate):
+            return self.get_response(request)
+        if not _profile_lock.acquire(blocking=False):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        try:
+            try:
+                profiler.enable()
+            except ValueError: # профилировщик или отладчик, запущенный не нами
+                return self.get_response(request)
+            started = time.perf_counter()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        finally:
+            _profile_lock.release()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if forced or elapsed_ms >= self.slow_ms:
+            match = getattr(request, 'resolver_match', None)
+            save_profile(match.url_name if match and match.url_name else 'unknown', profiler, elapsed_ms,
+                         request.path)
+        return response
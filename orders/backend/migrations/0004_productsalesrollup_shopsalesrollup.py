@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0003_alter_order_address'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('revenue', models.BigIntegerField(default=0, verbose_name='Выручка')),
+                ('units', models.BigIntegerField(default=0, verbose_name='Продано единиц')),
+                ('orders_count', models.IntegerField(default=0, verbose_name='Количество заказов')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='backend.product', verbose_name='Товар')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_sales_rollups', to='backend.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('shop', 'product', 'day'), name='unique_product_sales_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ShopSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('revenue', models.BigIntegerField(default=0, verbose_name='Выручка')),
+                ('units', models.BigIntegerField(default=0, verbose_name='Продано единиц')),
+                ('orders_count', models.IntegerField(default=0, verbose_name='Количество заказов')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='backend.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('shop', 'day'), name='unique_shop_sales_rollup')],
+            },
+        ),
+    ]
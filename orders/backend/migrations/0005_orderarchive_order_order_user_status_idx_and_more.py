@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0004_productsalesrollup_shopsalesrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Номер заказа')),
+                ('dt', models.DateTimeField(verbose_name='Дата заказа')),
+                ('status', models.CharField(choices=[('basket', 'Корзина'), ('new', 'Новый заказ'), ('delivery', 'Доставка'), ('finish', 'Исполнен'), ('canceled', 'Отменён')], max_length=15, verbose_name='Статус заказа')),
+                ('total_sum', models.BigIntegerField(default=0, verbose_name='Сумма заказа')),
+                ('payload', models.BinaryField(verbose_name='Состав заказа (zlib JSON)')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')),
+            ],
+            options={
+                'ordering': ['-dt'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'status'], name='order_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'dt'], name='order_status_dt_idx'),
+        ),
+        migrations.AddField(
+            model_name='orderarchive',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to=settings.AUTH_USER_MODEL, verbose_name='Покупатель'),
+        ),
+        migrations.AddIndex(
+            model_name='orderarchive',
+            index=models.Index(fields=['user', '-dt'], name='order_archive_user_dt_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0005_orderarchive_order_order_user_status_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(verbose_name='Ссылка на файл обновления')),
+                ('etag', models.CharField(blank=True, max_length=255, verbose_name='ETag')),
+                ('last_modified', models.CharField(blank=True, max_length=64, verbose_name='Last-Modified')),
+                ('content_hash', models.CharField(blank=True, max_length=64, verbose_name='SHA-256 содержимого')),
+                ('imported_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата последнего импорта')),
+                ('shop', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='feed_state', to='backend.shop', verbose_name='Магазин')),
+            ],
+        ),
+    ]
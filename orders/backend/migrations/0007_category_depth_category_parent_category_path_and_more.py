@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_category_paths(apps, schema_editor):
+    """Существующие категории становятся корнями дерева"""
+    Category = apps.get_model('backend', 'Category')
+    Product = apps.get_model('backend', 'Product')
+    for category in Category.objects.all():
+        Category.objects.filter(id=category.id).update(
+            path=f'/{category.id}/', product_count=Product.objects.filter(category_id=category.id).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0006_feedstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Уровень вложенности'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='backend.category', verbose_name='Родительская категория'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255, verbose_name='Путь в дереве'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Товаров в категории с подкатегориями'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='category_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(fill_category_paths, migrations.RunPython.noop),
+    ]
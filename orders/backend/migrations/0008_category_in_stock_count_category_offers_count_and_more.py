@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:18
+
+from django.db import migrations, models
+from django.db.models import F, Func, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    """Начальные значения счётчиков по уже загруженному каталогу"""
+    Shop = apps.get_model('backend', 'Shop')
+    Category = apps.get_model('backend', 'Category')
+    ProductInfo = apps.get_model('backend', 'ProductInfo')
+
+    def count(queryset):
+        return Coalesce(Subquery(queryset.order_by().annotate(
+            count=Func(F('id'), function='COUNT')).values('count')), 0)
+
+    offers = ProductInfo.objects.filter(shop_id=OuterRef('id'))
+    Shop.objects.update(offers_count=count(offers), in_stock_count=count(offers.filter(quantity__gt=0)))
+    offers = ProductInfo.objects.filter(product__category__path__startswith=OuterRef('path'), shop__opened=True)
+    Category.objects.update(offers_count=count(offers), in_stock_count=count(offers.filter(quantity__gt=0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0007_category_depth_category_parent_category_path_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='in_stock_count',
+            field=models.IntegerField(default=0, verbose_name='Предложений в наличии'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='offers_count',
+            field=models.IntegerField(default=0, verbose_name='Предложений'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='in_stock_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Предложений в наличии'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='offers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Предложений'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
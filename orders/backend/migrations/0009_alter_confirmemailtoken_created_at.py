@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0008_category_in_stock_count_category_offers_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='confirmemailtoken',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
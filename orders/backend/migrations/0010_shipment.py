@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def fill_shipments(apps, schema_editor):
+    """Отправления для уже оформленных заказов: по одному на каждый магазин заказа со статусом заказа"""
+    OrderItem = apps.get_model('backend', 'OrderItem')
+    Shipment = apps.get_model('backend', 'Shipment')
+    lines = OrderItem.objects.exclude(order__status='basket').values(
+        'order_id', 'order__dt', 'order__status', 'product_info__shop_id').annotate(
+        subtotal=Sum(F('quantity') * F('product_info__price'))).order_by()
+    Shipment.objects.bulk_create([
+        Shipment(order_id=line['order_id'], shop_id=line['product_info__shop_id'], dt=line['order__dt'],
+                 status=line['order__status'], subtotal=line['subtotal'] or 0)
+        for line in lines.iterator(chunk_size=2000)], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0009_alter_confirmemailtoken_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Shipment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dt', models.DateTimeField(verbose_name='Дата заказа')),
+                ('status', models.CharField(choices=[('basket', 'Корзина'), ('new', 'Новый заказ'), ('delivery', 'Доставка'), ('finish', 'Исполнен'), ('canceled', 'Отменён')], max_length=15, verbose_name='Статус отправления')),
+                ('subtotal', models.BigIntegerField(default=0, verbose_name='Сумма по магазину')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shipments', to='backend.order', verbose_name='Заказ')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shipments', to='backend.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'ordering': ['-dt'],
+                'indexes': [models.Index(fields=['shop', 'status', 'dt'], name='shipment_shop_status_idx')],
+                'constraints': [models.UniqueConstraint(fields=('order', 'shop'), name='unique_order_shipment')],
+            },
+        ),
+        migrations.RunPython(fill_shipments, migrations.RunPython.noop),
+    ]
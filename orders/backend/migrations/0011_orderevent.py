@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0010_shipment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('order_id', models.BigIntegerField(verbose_name='Номер заказа')),
+                ('shop_id', models.BigIntegerField(verbose_name='Магазин')),
+                ('kind', models.CharField(choices=[('created', 'Заказ оформлен'), ('status', 'Изменён статус')], max_length=10, verbose_name='Событие')),
+                ('status', models.CharField(choices=[('basket', 'Корзина'), ('new', 'Новый заказ'), ('delivery', 'Доставка'), ('finish', 'Исполнен'), ('canceled', 'Отменён')], max_length=15, verbose_name='Статус отправления')),
+                ('order_status', models.CharField(choices=[('basket', 'Корзина'), ('new', 'Новый заказ'), ('delivery', 'Доставка'), ('finish', 'Исполнен'), ('canceled', 'Отменён')], max_length=15, verbose_name='Статус заказа')),
+                ('dt', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_events', to=settings.AUTH_USER_MODEL, verbose_name='Получатель')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['user', 'id'], name='order_event_user_idx')],
+            },
+        ),
+    ]
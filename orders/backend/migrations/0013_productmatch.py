@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0012_recommendationstate_productpair_relatedproduct'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Название в прайсе')),
+                ('model', models.CharField(blank=True, default='', max_length=80, verbose_name='Модель в прайсе')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('state', models.CharField(choices=[('new', 'Ожидает проверки'), ('accepted', 'Совпадение подтверждено'), ('rejected', 'Совпадение отклонено')], default='new', max_length=10, verbose_name='Решение')),
+                ('dt', models.DateTimeField(auto_now_add=True)),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.product', verbose_name='Похожий товар')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.category', verbose_name='Категория')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.product', verbose_name='Заведённый товар')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_matches', to='backend.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['state', 'category'], name='product_match_state_idx')],
+                'constraints': [models.UniqueConstraint(fields=('category', 'name', 'candidate'), name='unique_product_match')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:52
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_prices(apps, schema_editor):
+    """Цены позиций уже оформленных заказов: исходная цена неизвестна, фиксируем текущую цену предложения"""
+    OrderItem = apps.get_model('backend', 'OrderItem')
+    ProductInfo = apps.get_model('backend', 'ProductInfo')
+    OrderItem.objects.exclude(order__status='basket').update(price=Subquery(
+        ProductInfo.objects.filter(id=OuterRef('product_info_id')).values('price')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0013_productmatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='price',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Цена на момент оформления'),
+        ),
+        migrations.RunPython(fill_prices, migrations.RunPython.noop),
+    ]
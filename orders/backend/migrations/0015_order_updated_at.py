@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:53
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_updated_at(apps, schema_editor):
+    """Для существующих заказов дата изменения неизвестна, берём дату создания"""
+    Order = apps.get_model('backend', 'Order')
+    Order.objects.update(updated_at=F('dt'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0014_orderitem_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'updated_at'], name='order_status_updated_idx'),
+        ),
+    ]
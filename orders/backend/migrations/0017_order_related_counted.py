@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:02
+
+from django.db import migrations, models
+
+
+def mark_counted(apps, schema_editor):
+    """Исполненные заказы, учтённые по прежнему водяному знаку событий, отмечаем учтёнными"""
+    RecommendationState = apps.get_model('backend', 'RecommendationState')
+    OrderEvent = apps.get_model('backend', 'OrderEvent')
+    Order = apps.get_model('backend', 'Order')
+    state = RecommendationState.objects.first()
+    if state is None or not state.last_event_id:
+        return
+    pending = OrderEvent.objects.filter(id__gt=state.last_event_id, kind='status', order_status='finish').values(
+        'order_id')
+    Order.objects.filter(status='finish').exclude(id__in=pending).update(related_counted=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0016_user_type_choices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='related_counted',
+            field=models.BooleanField(default=False, verbose_name='Учтён в рекомендациях'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'related_counted'], name='order_related_idx'),
+        ),
+        migrations.RunPython(mark_counted, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='recommendationstate',
+            name='last_event_id',
+        ),
+    ]
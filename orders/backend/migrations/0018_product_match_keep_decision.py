@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0017_order_related_counted'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productmatch',
+            name='product',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='backend.product', verbose_name='Заведённый товар'),
+        ),
+    ]
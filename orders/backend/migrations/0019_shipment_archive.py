@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:23
+
+import json
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_shipments(apps, schema_editor):
+    """Отправления уже архивных заказов восстанавливаем из сохранённого состава заказа"""
+    OrderArchive = apps.get_model('backend', 'OrderArchive')
+    ShipmentArchive = apps.get_model('backend', 'ShipmentArchive')
+    Shop = apps.get_model('backend', 'Shop')
+    shops = set(Shop.objects.values_list('id', flat=True))
+    rows = []
+    for order_id, dt, payload in OrderArchive.objects.values_list('id', 'dt', 'payload').iterator(chunk_size=500):
+        order = json.loads(zlib.decompress(payload))
+        for shipment in order['shipments']:
+            if shipment['shop'] not in shops:
+                continue
+            data = {'id': shipment['id'], 'order': order_id, 'dt': order['dt'], 'status': shipment['status'],
+                    'ordered_items': [item for item in order['ordered_items']
+                                      if item['product_info']['shop'] == shipment['shop']],
+                    'total_sum': shipment['subtotal'], 'address': order['address']}
+            rows.append(ShipmentArchive(id=shipment['id'], order_id=order_id, shop_id=shipment['shop'], dt=dt,
+                                        status=shipment['status'],
+                                        payload=zlib.compress(json.dumps(data, ensure_ascii=False).encode())))
+        if len(rows) >= 1000:
+            ShipmentArchive.objects.bulk_create(rows, ignore_conflicts=True)
+            rows = []
+    ShipmentArchive.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0018_product_match_keep_decision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipmentArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Номер отправления')),
+                ('dt', models.DateTimeField(verbose_name='Дата заказа')),
+                ('status', models.CharField(choices=[('basket', 'Корзина'), ('new', 'Новый заказ'), ('delivery', 'Доставка'), ('finish', 'Исполнен'), ('canceled', 'Отменён')], max_length=15, verbose_name='Статус отправления')),
+                ('payload', models.BinaryField(verbose_name='Отправление (zlib JSON)')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shipments', to='backend.orderarchive', verbose_name='Архивный заказ')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_shipments', to='backend.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'ordering': ['-dt'],
+                'indexes': [models.Index(fields=['shop', 'status', 'dt'], name='shipment_archive_shop_idx')],
+            },
+        ),
+        migrations.RunPython(fill_shipments, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,12 @@
 from django.db import models
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django_rest_passwordreset.tokens import get_token_generator
 
 
 USER_TYPE_CHOICES = (
     ('seller', 'Продавец'),
-    ('byer', 'Покупатель'),
+    ('buyer', 'Покупатель'),
 )
 
 STATUS_CHOICES = (
@@ -16,6 +17,14 @@ STATUS_CHOICES = (
     ('canceled', 'Отменён'),
 )
 
+SALE_STATUSES = ('new', 'delivery', 'finish') # статусы заказов, учитываемые в аналитике продаж
+
+# допустимые переходы статусов заказа после оформления (корзина -> новый заказ происходит при оформлении)
+ORDER_TRANSITIONS = {
+    'new': ('delivery', 'canceled'),
+    'delivery': ('finish', 'canceled'),
+}
+
 class UserManager(BaseUserManager):
     """
     Кастомный пользовательский менеджер
@@ -77,7 +86,7 @@ class ConfirmEmailToken(models.Model):
         return get_token_generator().generate_token()
 
     user = models.ForeignKey(User, related_name='confirm_email_token', on_delete=models.CASCADE)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True) # поиск просроченных токенов при очистке
     key = models.CharField(max_length=64, unique=True)
 
     def save(self, *args, **kwargs):
@@ -122,6 +131,8 @@ class Shop(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, verbose_name='Продавец', blank=True, null=True)
     opened = models.BooleanField(verbose_name='Статус работы магазина', default=True)
     url = models.URLField(verbose_name='Ссылка на сайт магазина', blank=True, null=True)
+    offers_count = models.PositiveIntegerField(verbose_name='Предложений', default=0)
+    in_stock_count = models.PositiveIntegerField(verbose_name='Предложений в наличии', default=0)
 
     class Meta:
         ordering = ['name']
@@ -130,17 +141,63 @@ class Shop(models.Model):
         return self.name
 
 
+class FeedState(models.Model):
+    """
+    Состояние последней успешной загрузки прайса магазина: заголовки для условного запроса и хеш содержимого
+    """
+    objects = models.manager.Manager()
+    shop = models.OneToOneField(Shop, on_delete=models.CASCADE, related_name='feed_state', verbose_name='Магазин')
+    url = models.URLField(verbose_name='Ссылка на файл обновления')
+    etag = models.CharField(max_length=255, verbose_name='ETag', blank=True)
+    last_modified = models.CharField(max_length=64, verbose_name='Last-Modified', blank=True)
+    content_hash = models.CharField(max_length=64, verbose_name='SHA-256 содержимого', blank=True)
+    imported_at = models.DateTimeField(verbose_name='Дата последнего импорта', blank=True, null=True)
+
+    def __str__(self):
+        return f'Прайс {self.shop}: {self.url}'
+
+
 class Category(models.Model):
+    """
+    Категория каталога. Дерево категорий хранится материализованным путём из id предков: '/1/5/12/'.
+    Поддерево узла выбирается одним запросом по префиксу пути, независимо от глубины.
+    """
     objects = models.manager.Manager()
     name = models.CharField(max_length=50, verbose_name='Название категориии')
     shops = models.ManyToManyField(Shop, related_name='categories', verbose_name='Магазины', blank=True)
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, related_name='children',
+                               verbose_name='Родительская категория', blank=True, null=True)
+    path = models.CharField(max_length=255, verbose_name='Путь в дереве', editable=False, default='')
+    depth = models.PositiveSmallIntegerField(verbose_name='Уровень вложенности', editable=False, default=0)
+    product_count = models.PositiveIntegerField(verbose_name='Товаров в категории с подкатегориями', default=0)
+    # предложения открытых магазинов в категории с подкатегориями
+    offers_count = models.IntegerField(verbose_name='Предложений', default=0)
+    in_stock_count = models.IntegerField(verbose_name='Предложений в наличии', default=0)
 
     class Meta:
         ordering = ['name']
+        indexes = [models.Index(fields=['path'], name='category_path_idx', opclasses=['varchar_pattern_ops'])]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Пересчитываем путь узла и, при переносе в другую ветку, пути всех его потомков"""
+        parent_path = Category.objects.filter(id=self.parent_id).values_list('path', flat=True).first() or '/'
+        if self.path and parent_path.startswith(self.path):
+            raise ValueError('Категорию нельзя вложить в её же подкатегорию')
+        super().save(*args, **kwargs)
+        path = f'{parent_path}{self.pk}/'
+        if path == self.path:
+            return
+        old_path, depth = self.path, path.count('/') - 2
+        Category.objects.filter(pk=self.pk).update(path=path, depth=depth)
+        if old_path:
+            Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(models.Value(path), Substr('path', len(old_path) + 1)),
+                depth=models.F('depth') + depth - self.depth)
+        self.path, self.depth = path, depth
+
 
 class Product(models.Model):
     objects = models.manager.Manager()
@@ -204,10 +261,20 @@ class Order(models.Model):
     address = models.ForeignKey(Contact, on_delete=models.CASCADE, related_name='orders', verbose_name='Адрес',
                                 blank=True, null=True)
     dt = models.DateTimeField(auto_now_add=True)
+    # последнее изменение корзины: брошенные корзины удаляются по нему, а не по дате создания
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
     status = models.CharField(choices=STATUS_CHOICES, max_length=15, verbose_name='Статус заказа')
+    # исполненный заказ учтён в матрице совместных покупок (build_related)
+    related_counted = models.BooleanField(default=False, verbose_name='Учтён в рекомендациях')
 
     class Meta:
         ordering = ['-dt']
+        indexes = [
+            models.Index(fields=['user', 'status'], name='order_user_status_idx'),
+            models.Index(fields=['status', 'dt'], name='order_status_dt_idx'), # для отбора заказов на архивацию
+            models.Index(fields=['status', 'updated_at'], name='order_status_updated_idx'), # для очистки корзин
+            models.Index(fields=['status', 'related_counted'], name='order_related_idx'), # для build_related
+        ]
 
     def __str__(self):
         return f'Заказ № {self.pk} от {self.dt}'
@@ -219,6 +286,199 @@ class OrderItem(models.Model):
     product_info = models.ForeignKey(ProductInfo, on_delete=models.CASCADE, related_name='ordered_items',
                                      verbose_name='Информация о продукте')
     quantity = models.PositiveIntegerField(verbose_name='Количество')
+    # цена фиксируется при оформлении заказа, пока заказ в корзине - берётся текущая цена предложения
+    price = models.PositiveIntegerField(verbose_name='Цена на момент оформления', null=True, blank=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['order_id', 'product_info'], name='unique_order_item')]
+
+
+class Shipment(models.Model):
+    """
+    Отправление - часть заказа одного магазина.
+    Создаётся при оформлении заказа для каждого магазина из корзины, продавец видит и продвигает по статусам только
+    свои отправления, а статус заказа покупателя выводится из статусов его отправлений.
+    """
+    objects = models.manager.Manager()
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='shipments', verbose_name='Заказ')
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='shipments', verbose_name='Магазин')
+    dt = models.DateTimeField(verbose_name='Дата заказа')
+    status = models.CharField(choices=STATUS_CHOICES, max_length=15, verbose_name='Статус отправления')
+    subtotal = models.BigIntegerField(verbose_name='Сумма по магазину', default=0)
+
+    class Meta:
+        ordering = ['-dt']
+        constraints = [models.UniqueConstraint(fields=['order', 'shop'], name='unique_order_shipment')]
+        indexes = [models.Index(fields=['shop', 'status', 'dt'], name='shipment_shop_status_idx')]
+
+    def __str__(self):
+        return f'Отправление магазина {self.shop_id} по заказу № {self.order_id}'
+
+
+class OrderEvent(models.Model):
+    """
+    Событие заказа для потока уведомлений: оформление или смена статуса отправления.
+    Для каждого события пишется строка покупателю и строка продавцу магазина, клиент дочитывает строки своего
+    пользователя с id больше последнего полученного и строки за последние секунды (ORDER_EVENTS['LAG']), которые
+    зафиксированы позже строк с большими id. Старые события удаляются командой archive_orders.
+    """
+    objects = models.manager.Manager()
+    KIND_CHOICES = (('created', 'Заказ оформлен'), ('status', 'Изменён статус'))
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='order_events', verbose_name='Получатель')
+    order_id = models.BigIntegerField(verbose_name='Номер заказа')
+    shop_id = models.BigIntegerField(verbose_name='Магазин')
+    kind = models.CharField(choices=KIND_CHOICES, max_length=10, verbose_name='Событие')
+    status = models.CharField(choices=STATUS_CHOICES, max_length=15, verbose_name='Статус отправления')
+    order_status = models.CharField(choices=STATUS_CHOICES, max_length=15, verbose_name='Статус заказа')
+    dt = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['user', 'id'], name='order_event_user_idx')]
+
+
+class OrderArchive(models.Model):
+    """
+    Архив исполненных и отменённых заказов.
+    Заказ переносится сюда из рабочих таблиц целиком: id сохраняется, а состав заказа хранится сжатым JSON в том же
+    виде, в котором его отдаёт OrderSerializer.
+    """
+    objects = models.manager.Manager()
+    id = models.BigIntegerField(primary_key=True, verbose_name='Номер заказа')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders', verbose_name='Покупатель')
+    dt = models.DateTimeField(verbose_name='Дата заказа')
+    status = models.CharField(choices=STATUS_CHOICES, max_length=15, verbose_name='Статус заказа')
+    total_sum = models.BigIntegerField(verbose_name='Сумма заказа', default=0)
+    payload = models.BinaryField(verbose_name='Состав заказа (zlib JSON)')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')
+
+    class Meta:
+        ordering = ['-dt']
+        indexes = [models.Index(fields=['user', '-dt'], name='order_archive_user_dt_idx')]
+
+    def __str__(self):
+        return f'Архивный заказ № {self.pk} от {self.dt}'
+
+
+class ShipmentArchive(models.Model):
+    """
+    Архив отправлений архивных заказов - история продавца. Отправление хранится сжатым JSON в том же виде,
+    в котором его отдаёт ShipmentSerializer: только позиции своего магазина.
+    """
+    objects = models.manager.Manager()
+    id = models.BigIntegerField(primary_key=True, verbose_name='Номер отправления')
+    order = models.ForeignKey(OrderArchive, on_delete=models.CASCADE, related_name='shipments',
+                              verbose_name='Архивный заказ')
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='archived_shipments', verbose_name='Магазин')
+    dt = models.DateTimeField(verbose_name='Дата заказа')
+    status = models.CharField(choices=STATUS_CHOICES, max_length=15, verbose_name='Статус отправления')
+    payload = models.BinaryField(verbose_name='Отправление (zlib JSON)')
+
+    class Meta:
+        ordering = ['-dt']
+        indexes = [models.Index(fields=['shop', 'status', 'dt'], name='shipment_archive_shop_idx')]
+
+    def __str__(self):
+        return f'Архивное отправление магазина {self.shop_id} по заказу № {self.order_id}'
+
+
+class ShopSalesRollup(models.Model):
+    """
+    Предагрегированные продажи магазина за день.
+    Обновляется инкрементально при оформлении и отмене заказов, недели и месяцы собираются из дневных строк.
+    """
+    objects = models.manager.Manager()
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='sales_rollups', verbose_name='Магазин')
+    day = models.DateField(verbose_name='День')
+    revenue = models.BigIntegerField(verbose_name='Выручка', default=0)
+    units = models.BigIntegerField(verbose_name='Продано единиц', default=0)
+    orders_count = models.IntegerField(verbose_name='Количество заказов', default=0)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [models.UniqueConstraint(fields=['shop', 'day'], name='unique_shop_sales_rollup')]
+
+
+class ProductSalesRollup(models.Model):
+    """
+    Предагрегированные продажи товара в магазине за день (для топа товаров)
+    """
+    objects = models.manager.Manager()
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='product_sales_rollups',
+                             verbose_name='Магазин')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_rollups', verbose_name='Товар')
+    day = models.DateField(verbose_name='День')
+    revenue = models.BigIntegerField(verbose_name='Выручка', default=0)
+    units = models.BigIntegerField(verbose_name='Продано единиц', default=0)
+    orders_count = models.IntegerField(verbose_name='Количество заказов', default=0)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [models.UniqueConstraint(fields=['shop', 'product', 'day'], name='unique_product_sales_rollup')]
+
+
+class ProductPair(models.Model):
+    """
+    Разреженная матрица совместных покупок: в скольких исполненных заказах товары куплены вместе.
+    Каждая пара хранится в обе стороны, чтобы соседей товара можно было выбрать по одному индексу.
+    """
+    objects = models.manager.Manager()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', verbose_name='Товар')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', verbose_name='Сопутствующий товар')
+    count = models.IntegerField(verbose_name='Совместных заказов', default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['product', 'related'], name='unique_product_pair')]
+
+
+class RelatedProduct(models.Model):
+    """
+    Топ-K товаров, которые чаще всего покупают вместе с товаром (пересобирается командой build_related)
+    """
+    objects = models.manager.Manager()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_products',
+                                verbose_name='Товар')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_to',
+                                verbose_name='Сопутствующий товар')
+    rank = models.PositiveSmallIntegerField(verbose_name='Место')
+    score = models.IntegerField(verbose_name='Совместных заказов')
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [models.UniqueConstraint(fields=['product', 'rank'], name='unique_related_product_rank')]
+
+
+class RecommendationState(models.Model):
+    """
+    Состояние пересчёта совместных покупок: блокировка строки не даёт двум запускам учесть одни заказы дважды
+    """
+    objects = models.manager.Manager()
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата пересчёта')
+
+
+class ProductMatch(models.Model):
+    """
+    Очередь проверки сомнительных совпадений при импорте: позиция прайса похожа на товар каталога, но не настолько,
+    чтобы связать их автоматически. До решения для позиции заводится отдельный товар (product). Принятое решение
+    связывает позиции с кандидатом и учитывается при следующих импортах, отклонённое больше не предлагается.
+    """
+    objects = models.manager.Manager()
+    STATE_CHOICES = (('new', 'Ожидает проверки'), ('accepted', 'Совпадение подтверждено'),
+                     ('rejected', 'Совпадение отклонено'))
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='product_matches', verbose_name='Магазин')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+', verbose_name='Категория')
+    name = models.CharField(max_length=100, verbose_name='Название в прайсе')
+    model = models.CharField(max_length=80, verbose_name='Модель в прайсе', blank=True, default='')
+    # после подтверждения заведённый товар удаляется, решение остаётся для следующих импортов
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, related_name='+', verbose_name='Заведённый товар',
+                                null=True)
+    candidate = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', verbose_name='Похожий товар')
+    score = models.FloatField(verbose_name='Сходство')
+    state = models.CharField(choices=STATE_CHOICES, max_length=10, verbose_name='Решение', default='new')
+    dt = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        constraints = [models.UniqueConstraint(fields=['order_id', 'product_info'], name='unique_order_item')]
\ No newline at end of file
+        ordering = ['-score']
+        constraints = [models.UniqueConstraint(fields=['category', 'name', 'candidate'], name='unique_product_match')]
+        indexes = [models.Index(fields=['state', 'category'], name='product_match_state_idx')]
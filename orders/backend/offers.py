@@ -0,0 +1,96 @@
+import csv
+import io
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from .baskets import basket_users, invalidate_baskets
+from .counters import apply_category_deltas
+from .singleflight import bump_catalog_version
+from .models import Shop, ProductInfo
+from .validation import MAX_INT
+
+OFFER_FIELDS = ('external_id', 'price', 'price_rrc', 'quantity')
+
+
+def parse_offers(rows):
+    """
+    Проверяем строки пакета обновления: external_id обязателен, цены и количество - необязательные целые числа
+    от 0 до MAX_INT (границы integer-полей в БД).
+    Возвращает (строки, ошибки по номерам строк). Повторы external_id схлопываются, побеждает последняя строка.
+    """
+
+    offers, errors = {}, {}
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors[number] = 'Строка должна быть объектом с полями ' + ', '.join(OFFER_FIELDS)
+            continue
+        values = []
+        for field in OFFER_FIELDS:
+            value = row.get(field)
+            if value in (None, '') and field != 'external_id':
+                values.append(None)
+                continue
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                value = -1
+            if not 0 <= value <= MAX_INT:
+                errors[number] = f'Поле {field} должно быть целым числом от 0 до {MAX_INT}'
+                break
+            values.append(value)
+        else:
+            offers[values[0]] = tuple(values)
+    return list(offers.values()), errors
+
+
+def read_csv(body):
+    """Разбор CSV с заголовком external_id,price,price_rrc,quantity"""
+    return list(csv.DictReader(io.StringIO(body.decode('utf-8-sig'))))
+
+
+def patch_offers(shop_id, offers, batch_size=1000):
+    """
+    Обновляем цены и остатки товаров магазина по external_id одним UPDATE ... FROM (VALUES ...) на порцию.
+    Незаданные в строке поля не меняются. Счётчики наличия магазина и категорий поправляются на изменившиеся позиции.
+    Возвращает (id обновлённых ProductInfo, ненайденные external_id).
+    """
+
+    table = ProductInfo._meta.db_table
+    updated, matched, stock = [], set(), {}
+    with transaction.atomic():
+        shop = Shop.objects.select_for_update().get(id=shop_id)
+        with connection.cursor() as cursor:
+            for start in range(0, len(offers), batch_size):
+                batch = offers[start:start + batch_size]
+                values = ', '.join(['(CAST(%s AS bigint), CAST(%s AS integer), CAST(%s AS integer), '
+                                    'CAST(%s AS integer))'] * len(batch))
+                # блокируем строки и запоминаем остатки до обновления для пересчёта наличия
+                before = dict(ProductInfo.objects.select_for_update().filter(
+                    shop_id=shop_id, external_id__in=[offer[0] for offer in batch]).values_list('id', 'quantity'))
+                cursor.execute(
+                    f'WITH v (external_id, price, price_rrc, quantity) AS (VALUES {values}) '
+                    f'UPDATE {table} SET price = COALESCE(v.price, {table}.price), '
+                    f'price_rrc = COALESCE(v.price_rrc, {table}.price_rrc), '
+                    f'quantity = COALESCE(v.quantity, {table}.quantity) '
+                    f'FROM v WHERE {table}.shop_id = %s AND {table}.external_id = v.external_id '
+                    f'RETURNING {table}.id, {table}.external_id, {table}.quantity',
+                    [value for offer in batch for value in offer] + [shop_id])
+                for product_info_id, external_id, after in cursor.fetchall():
+                    updated.append(product_info_id)
+                    matched.add(external_id)
+                    if (before[product_info_id] > 0) != (after > 0):
+                        stock[product_info_id] = 1 if after > 0 else -1
+        if stock:
+            Shop.objects.filter(id=shop_id).update(in_stock_count=F('in_stock_count') + sum(stock.values()))
+            if shop.opened:
+                deltas = defaultdict(lambda: (0, 0))
+                for product_info_id, category_id in ProductInfo.objects.filter(id__in=stock).values_list(
+                        'id', 'product__category_id'):
+                    deltas[category_id] = (0, deltas[category_id][1] + stock[product_info_id])
+                apply_category_deltas(deltas)
+        users = basket_users(updated)
+        transaction.on_commit(lambda: invalidate_baskets(users)) # цены и остатки в корзинах изменились
+        transaction.on_commit(bump_catalog_version) # закешированные выборки каталога устарели
+    return updated, sorted({offer[0] for offer in offers} - matched)
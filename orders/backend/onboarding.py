@@ -0,0 +1,100 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.mail import send_mass_mail
+from django.db import connections, transaction
+
+from .models import User, ConfirmEmailToken
+
+USER_FIELDS = ('first_name', 'last_name', 'username', 'email', 'password', 'phone')
+UNIQUE_FIELDS = ('email', 'username', 'phone')
+FIELDS = (*USER_FIELDS, 'type')
+# пароль проверяется validate_password до хеширования, остальные поля модели при загрузке не заполняются
+EXCLUDED_FIELDS = [field.name for field in User._meta.fields if field.name not in FIELDS or field.name == 'password']
+
+
+def validate_rows(rows):
+    """
+    Проверка строк до записи: обязательные поля, проверки полей модели (длина, формат email и имени,
+    допустимый тип), сложность пароля, уникальность email, имени и телефона в файле и в базе. Строка с ошибкой
+    отбрасывается с сообщением и не срывает вставку остальных.
+    Возвращает (корректные строки, ошибки по номерам строк).
+    """
+
+    valid, errors, seen = [], {}, {field: set() for field in UNIQUE_FIELDS}
+    for number, row in enumerate(rows, start=1):
+        missing = [field for field in USER_FIELDS if not row.get(field)]
+        if missing:
+            errors[number] = f'Не заполнены поля: {", ".join(missing)}'
+            continue
+        row = dict(row, email=User.objects.normalize_email(row['email']))
+        user = User(**{field: row[field] for field in FIELDS if row.get(field)})
+        try:
+            user.clean_fields(exclude=EXCLUDED_FIELDS)
+        except ValidationError as err:
+            errors[number] = '; '.join(f'{field}: {" ".join(messages)}' for field, messages in err.message_dict.items())
+            continue
+        row.update({field: getattr(user, field) for field in FIELDS if row.get(field)}) # значения после to_python
+        if any(row[field] in seen[field] for field in UNIQUE_FIELDS):
+            errors[number] = 'Email, имя пользователя или телефон повторяется в файле'
+            continue
+        try:
+            validate_password(row['password'])
+        except ValidationError as err:
+            errors[number] = ' '.join(err.messages)
+            continue
+        for field in UNIQUE_FIELDS:
+            seen[field].add(row[field])
+        valid.append((number, row))
+    taken = {field: set(User.objects.filter(**{f'{field}__in': seen[field]}).values_list(field, flat=True))
+             for field in UNIQUE_FIELDS}
+    for number, row in valid:
+        if any(row[field] in taken[field] for field in UNIQUE_FIELDS):
+            errors[number] = 'Пользователь с таким email, именем пользователя или телефоном уже зарегистрирован'
+    return [row for number, row in valid if number not in errors], errors
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Хеширование паролей в пуле процессов: хеш намеренно медленный, поэтому распараллеливается по ядрам
+    """
+
+    connections.close_all() # дочерние процессы не должны наследовать соединения с БД
+    chunksize = max(1, len(passwords) // ((workers or os.cpu_count()) * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def send_confirmations(tokens, batch_size=100):
+    """Письма с токенами подтверждения пачками, каждая пачка - одно SMTP-соединение"""
+    for start in range(0, len(tokens), batch_size):
+        send_mass_mail([(f'Token for {token.user.email}', token.key, settings.EMAIL_HOST_USER, [token.user.email])
+                        for token in tokens[start:start + batch_size]])
+
+
+def onboard_users(rows, workers=None, batch_size=500, email_batch_size=100):
+    """
+    Массовая регистрация покупателей: пользователи и токены подтверждения вставляются через bulk_create
+    (сигнал post_save не отправляется), письма уходят пачками после фиксации транзакции.
+    Возвращает (количество созданных пользователей, ошибки по номерам строк).
+    """
+
+    rows, errors = validate_rows(rows)
+    if not rows:
+        return 0, errors
+    hashes = hash_passwords([row['password'] for row in rows], workers)
+    users = [User(**{field: row[field] for field in USER_FIELDS if field != 'password'}, password=password,
+                  is_active=False, **({'type': row['type']} if row.get('type') else {}))
+             for row, password in zip(rows, hashes)]
+    with transaction.atomic():
+        users = User.objects.bulk_create(users, batch_size=batch_size)
+        tokens = ConfirmEmailToken.objects.bulk_create(
+            [ConfirmEmailToken(user=user, key=ConfirmEmailToken.generate_key()) for user in users],
+            batch_size=batch_size)
+        transaction.on_commit(lambda: send_confirmations(tokens, email_batch_size))
+    return len(users), errors
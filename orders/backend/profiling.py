@@ -0,0 +1,57 @@
+import json
+import pstats
+import re
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+PROFILE_NAME = re.compile(r'^[\w-]+\.pstats$')
+
+
+def profiling_settings():
+    config = {'SAMPLE_RATE': 0.0, 'SLOW_MS': 500, 'HEADER': 'X-Profile', 'DIR': settings.BASE_DIR / '.profiles',
+              'KEEP': 20, 'TOP': 30}
+    config.update(getattr(settings, 'PROFILING', {}))
+    return config
+
+
+def save_profile(url_name, profiler, elapsed_ms, path):
+    """
+    Сохраняем профиль запроса: pstats для загрузки и разбора (snakeviz, flameprof, gprof2dot) и рядом JSON с топом
+    функций по накопленному времени. Для каждого адреса хранятся только KEEP последних профилей.
+    """
+
+    config = profiling_settings()
+    directory = Path(config['DIR']) / url_name
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f'{time.strftime("%Y%m%d-%H%M%S")}-{int(time.time() * 1000) % 1000:03d}-{int(elapsed_ms)}ms'
+    profiler.dump_stats(directory / f'{name}.pstats')
+    stats = pstats.Stats(profiler).sort_stats('cumulative')
+    top = [{'function': f'{file}:{line}({func})', 'calls': calls, 'tottime': round(tottime, 6),
+            'cumtime': round(cumtime, 6)}
+           for (file, line, func), (_, calls, tottime, cumtime, _) in
+           sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:config['TOP']]]
+    (directory / f'{name}.json').write_text(json.dumps(
+        {'url_name': url_name, 'path': path, 'elapsed_ms': round(elapsed_ms, 1), 'top': top}, ensure_ascii=False))
+    for old in sorted(directory.glob('*.pstats'))[:-config['KEEP']]:
+        old.unlink(missing_ok=True)
+        old.with_suffix('.json').unlink(missing_ok=True)
+
+
+def list_profiles():
+    """Сохранённые профили медленных запросов, новые первыми"""
+    profiles = []
+    for summary in Path(profiling_settings()['DIR']).glob('*/*.json'):
+        data = json.loads(summary.read_text())
+        data.update(file=summary.with_suffix('.pstats').name, top=data['top'][:10])
+        profiles.append(data)
+    return sorted(profiles, key=lambda item: item['file'][:19], reverse=True)
+
+
+def profile_path(url_name, name):
+    """Путь к файлу профиля или None, если имя некорректно или файла нет"""
+    if not re.match(r'^[\w-]+$', url_name) or not PROFILE_NAME.match(name):
+        return None
+    path = Path(profiling_settings()['DIR']) / url_name / name
+    return path if path.is_file() else None
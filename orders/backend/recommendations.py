@@ -0,0 +1,145 @@
+import heapq
+from collections import Counter
+from itertools import permutations
+
+from django.db import transaction
+from django.db.models import F
+
+from .archive import iter_archived
+from .models import Order, OrderItem, Product, ProductPair, RelatedProduct, RecommendationState
+from .singleflight import bump_catalog_version
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError: # необязательные зависимости, без них пары считаются перебором на Python
+    np = sparse = None
+
+
+def cooccurrence(baskets):
+    """
+    Совместные покупки по списку корзин (множеств id товаров): {(товар, сопутствующий товар): число заказов}.
+    С numpy/scipy считается векторно как X^T X по разреженной матрице заказы x товары.
+    """
+
+    if sparse is None:
+        counts = Counter()
+        for basket in baskets:
+            counts.update(permutations(basket, 2))
+        return counts
+    products = sorted({product for basket in baskets for product in basket})
+    index = {product: position for position, product in enumerate(products)}
+    rows = np.repeat(np.arange(len(baskets)), [len(basket) for basket in baskets])
+    cols = np.fromiter((index[product] for basket in baskets for product in basket), dtype=np.int64, count=len(rows))
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)),
+                               shape=(len(baskets), len(products)))
+    pairs = (matrix.T @ matrix).tocoo()
+    mask = pairs.row != pairs.col
+    return {(products[row], products[col]): int(count)
+            for row, col, count in zip(pairs.row[mask], pairs.col[mask], pairs.data[mask])}
+
+
+def order_baskets(order_ids):
+    """Товары исполненных отправлений заказов, по множеству на заказ"""
+    baskets = {}
+    items = OrderItem.objects.filter(order_id__in=order_ids, order__shipments__shop_id=F('product_info__shop_id'),
+                                     order__shipments__status='finish').values_list('order_id',
+                                                                                    'product_info__product_id')
+    for order_id, product_id in items:
+        baskets.setdefault(order_id, set()).add(product_id)
+    return [basket for basket in baskets.values() if len(basket) > 1]
+
+
+def archived_baskets(batch_size=1000):
+    """
+    Товары исполненных отправлений архивных заказов порциями: их позиций в рабочих таблицах уже нет,
+    состав берётся из сохранённого JSON заказа. Товары, удалённые из каталога, пропускаются.
+    """
+
+    baskets = []
+    for order in iter_archived('finish', batch_size):
+        shops = {shipment['shop'] for shipment in order['shipments'] if shipment['status'] == 'finish'}
+        baskets.append({item['product_info']['product']['id'] for item in order['ordered_items']
+                        if item['product_info']['shop'] in shops})
+        if len(baskets) >= batch_size:
+            yield _existing(baskets)
+            baskets = []
+    if baskets:
+        yield _existing(baskets)
+
+
+def _existing(baskets):
+    known = set(Product.objects.filter(id__in={product for basket in baskets for product in basket}).values_list(
+        'id', flat=True))
+    baskets = [basket & known for basket in baskets]
+    return [basket for basket in baskets if len(basket) > 1]
+
+
+def merge_pairs(counts):
+    """Прибавляем посчитанные пары к сохранённой матрице. Возвращает множество затронутых товаров."""
+    touched = {product for product, _ in counts}
+    existing = {(pair.product_id, pair.related_id): pair for pair in ProductPair.objects.filter(
+        product_id__in=touched, related_id__in=touched)}
+    created = []
+    for key, count in counts.items():
+        if key in existing:
+            existing[key].count += count
+        else:
+            created.append(ProductPair(product_id=key[0], related_id=key[1], count=count))
+    ProductPair.objects.bulk_update([pair for key, pair in existing.items() if key in counts], ['count'],
+                                    batch_size=1000)
+    ProductPair.objects.bulk_create(created, batch_size=1000)
+    return touched
+
+
+def rebuild_top(product_ids, top=10, batch_size=500):
+    """Пересобираем топ-K соседей для товаров по сохранённой матрице"""
+    product_ids = sorted(product_ids)
+    for start in range(0, len(product_ids), batch_size):
+        chunk = product_ids[start:start + batch_size]
+        neighbours = {}
+        for product_id, related_id, count in ProductPair.objects.filter(product_id__in=chunk).values_list(
+                'product_id', 'related_id', 'count'):
+            neighbours.setdefault(product_id, []).append((count, -related_id))
+        with transaction.atomic():
+            RelatedProduct.objects.filter(product_id__in=chunk).delete()
+            RelatedProduct.objects.bulk_create([
+                RelatedProduct(product_id=product_id, related_id=-related, rank=rank, score=count)
+                for product_id, pairs in neighbours.items()
+                for rank, (count, related) in enumerate(heapq.nlargest(top, pairs), start=1)])
+
+
+def update_related(top=10, batch_size=1000, full=False):
+    """
+    Учитываем исполненные заказы, ещё не учтённые в матрице (Order.related_counted), либо при full=True
+    сбрасываем матрицу и отметки и пересчитываем по всем исполненным заказам, включая архивные (их пары
+    прибавляются в той же транзакции, что и сброс матрицы). Отметка ставится в одной транзакции
+    с прибавлением пар заказа, поэтому заказ учитывается ровно один раз независимо от того, в каком порядке
+    фиксировались транзакции исполнения и сохранились ли события заказа. Возвращает (заказов, товаров).
+    """
+
+    state = RecommendationState.objects.first() or RecommendationState.objects.create()
+    processed, touched = 0, set()
+    if full:
+        with transaction.atomic():
+            RecommendationState.objects.select_for_update().get(id=state.id)
+            ProductPair.objects.all().delete()
+            RelatedProduct.objects.all().delete()
+            Order.objects.filter(related_counted=True).update(related_counted=False)
+            for baskets in archived_baskets(batch_size):
+                touched |= merge_pairs(cooccurrence(baskets))
+    while True:
+        with transaction.atomic():
+            state = RecommendationState.objects.select_for_update().get(id=state.id)
+            order_ids = list(Order.objects.filter(status='finish', related_counted=False).order_by('id').values_list(
+                'id', flat=True)[:batch_size])
+            if not order_ids:
+                break
+            touched |= merge_pairs(cooccurrence(order_baskets(order_ids)))
+            Order.objects.filter(id__in=order_ids).update(related_counted=True)
+            state.save()
+        processed += len(order_ids)
+    rebuild_top(touched, top)
+    if touched:
+        bump_catalog_version() # закешированные подборки сопутствующих товаров устарели
+    return processed, len(touched)
@@ -0,0 +1,51 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import msgpack
+except ImportError: # необязательная зависимость, рендерер подключается в настройках только при её наличии
+    msgpack = None
+
+
+def compact(data):
+    """
+    Колоночное представление списков однотипных объектов: ключи один раз в columns, значения строками в rows.
+    Вложенные списки объектов сжимаются так же.
+    """
+
+    if isinstance(data, dict):
+        return {key: compact(value) for key, value in data.items()}
+    if isinstance(data, list):
+        if data and all(isinstance(item, dict) for item in data):
+            columns = list(data[0])
+            if all(list(item) == columns for item in data):
+                return {'columns': columns, 'rows': [[compact(item[key]) for key in columns] for item in data]}
+        return [compact(item) for item in data]
+    return data
+
+
+class CompactJSONRenderer(JSONRenderer):
+    """
+    JSON без повторяющихся ключей для списков (Accept: application/vnd.compact+json или ?format=compact)
+    """
+
+    media_type = 'application/vnd.compact+json'
+    format = 'compact'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(compact(data), accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Двоичный формат MessagePack (Accept: application/msgpack или ?format=msgpack). Требует пакет msgpack.
+    """
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=str)
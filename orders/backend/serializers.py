@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import User, Shop, Category, Product, Contact, ProductParameter, ProductInfo, OrderItem, Order
+from .models import User, Shop, Category, Product, Contact, ProductParameter, ProductInfo, OrderItem, Order, \
+    Shipment
 
 
 class ContactSerializer(serializers.ModelSerializer):
@@ -15,7 +16,7 @@ class UserSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = User
-        fields = ['id', 'first_name', 'last_name', 'username', 'email', 'type', 'phone']
+        fields = ['id', 'first_name', 'last_name', 'username', 'email', 'type', 'phone', 'contacts']
         read_only_fields = ['id']
 
 
@@ -23,16 +24,16 @@ class ShopSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Shop
-        fields = ['id', 'name', 'opened', 'url']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'opened', 'url', 'offers_count', 'in_stock_count']
+        read_only_fields = ['id', 'offers_count', 'in_stock_count']
 
 
 class CategorySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Category
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'parent', 'depth', 'product_count', 'offers_count', 'in_stock_count']
+        read_only_fields = ['id', 'depth', 'product_count', 'offers_count', 'in_stock_count']
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -75,11 +76,32 @@ class OrderItemCreateSerializer(OrderItemSerializer):
     product_info = ProductInfoSerializer(read_only=True)
 
 
+class ShipmentStatusSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Shipment
+        fields = ['id', 'shop', 'status', 'subtotal']
+        read_only_fields = fields
+
+
 class OrderSerializer(serializers.ModelSerializer):
     ordered_items = OrderItemCreateSerializer(read_only=True, many=True)
+    shipments = ShipmentStatusSerializer(read_only=True, many=True)
     total_sum = serializers.IntegerField()
 
     class Meta:
         model = Order
-        fields = ['id', 'dt', 'status', 'ordered_items', 'total_sum', 'address']
+        fields = ['id', 'dt', 'status', 'ordered_items', 'shipments', 'total_sum', 'address']
         read_only_fields = ['id']
+
+
+class ShipmentSerializer(serializers.ModelSerializer):
+    """Отправление для продавца: только позиции его магазина (order.shop_items заполняется через Prefetch)"""
+    ordered_items = OrderItemCreateSerializer(source='order.shop_items', read_only=True, many=True)
+    total_sum = serializers.IntegerField(source='subtotal', read_only=True)
+    address = serializers.IntegerField(source='order.address_id', read_only=True)
+
+    class Meta:
+        model = Shipment
+        fields = ['id', 'order', 'dt', 'status', 'ordered_items', 'total_sum', 'address']
+        read_only_fields = fields
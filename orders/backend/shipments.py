@@ -0,0 +1,59 @@
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Order, OrderItem, ProductInfo, Shipment, SALE_STATUSES
+
+# цена позиции оформленного заказа; для заказов, оформленных до появления поля, - текущая цена предложения
+ITEM_PRICE = Coalesce(F('price'), F('product_info__price'))
+
+
+def fix_prices(order_ids):
+    """Фиксируем цены позиций при оформлении заказа, чтобы витрины и суммы не зависели от последующих изменений цен"""
+    OrderItem.objects.filter(order_id__in=order_ids).update(price=Subquery(
+        ProductInfo.objects.filter(id=OuterRef('product_info_id')).values('price')[:1]))
+
+
+def create_shipments(order_ids):
+    """
+    Делим оформленные заказы на отправления по магазинам: одним запросом считаем суммы позиций по парам
+    заказ - магазин и вставляем отправления одним INSERT
+    """
+
+    lines = OrderItem.objects.filter(order_id__in=order_ids).values(
+        'order_id', 'order__dt', 'product_info__shop_id').annotate(
+        subtotal=Sum(F('quantity') * ITEM_PRICE)).order_by()
+    return Shipment.objects.bulk_create([
+        Shipment(order_id=line['order_id'], shop_id=line['product_info__shop_id'], dt=line['order__dt'],
+                 status='new', subtotal=line['subtotal'] or 0) for line in lines])
+
+
+def order_status(statuses):
+    """
+    Статус заказа по статусам его отправлений: отменён, если отменены все, иначе статус самого отстающего
+    из неотменённых отправлений
+    """
+
+    active = [status for status in statuses if status != 'canceled']
+    if not active:
+        return 'canceled'
+    return min(active, key=SALE_STATUSES.index)
+
+
+def sync_order_statuses(order_ids):
+    """
+    Пересчитываем статусы заказов по их отправлениям. Заказы группируются по новому статусу,
+    поэтому выполняется не больше одного UPDATE на статус. Возвращает id заказов, чей статус изменился.
+    """
+
+    statuses = {}
+    for order_id, status in Shipment.objects.filter(order_id__in=order_ids).values_list('order_id', 'status'):
+        statuses.setdefault(order_id, []).append(status)
+    current = dict(Order.objects.filter(id__in=statuses).values_list('id', 'status'))
+    groups = {}
+    for order_id, items in statuses.items():
+        status = order_status(items)
+        if current.get(order_id) != status:
+            groups.setdefault(status, []).append(order_id)
+    for status, ids in groups.items():
+        Order.objects.filter(id__in=ids).update(status=status)
+    return {order_id for ids in groups.values() for order_id in ids}
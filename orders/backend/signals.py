@@ -1,14 +1,26 @@
 from django.conf import settings
-from django.core.mail import send_mail, EmailMultiAlternatives
+from django.core.mail import send_mail, send_mass_mail, EmailMultiAlternatives
 from django.db.models.signals import post_save
 from django.dispatch import receiver, Signal
 from django_rest_passwordreset.signals import reset_password_token_created
 
-from .models import User, ConfirmEmailToken
+from .models import User, ConfirmEmailToken, Order, STATUS_CHOICES
 
 
 new_user_registered = Signal()
 new_order = Signal()
+orders_status_changed = Signal()
+
+def send_confirmation(user, replace=False):
+    """
+    Выдаём токен подтверждения почты и отправляем его письмом. replace - повторная отправка: прежние токены
+    пользователя (в том числе просроченные) удаляются.
+    """
+
+    if replace:
+        ConfirmEmailToken.objects.filter(user_id=user.pk).delete()
+    token = ConfirmEmailToken.objects.create(user_id=user.pk)
+    send_mail(f'Token for {user.email}', token.key, settings.EMAIL_HOST_USER, [user.email])
 
 @receiver(post_save, sender=User)
 def new_user_registered_signal(instance: User, created: bool, **kwargs):
@@ -17,8 +29,7 @@ def new_user_registered_signal(instance: User, created: bool, **kwargs):
     """
 
     if created and not instance.is_active:
-        token, _ = ConfirmEmailToken.objects.get_or_create(user_id=instance.pk)
-        send_mail(f'Token for {instance.email}', token.key, settings.EMAIL_HOST_USER, [instance.email])
+        send_confirmation(instance) # у нового пользователя токена ещё нет
 
 @receiver(reset_password_token_created)
 def password_reset_token_created(reset_password_token, **kwargs):
@@ -38,3 +49,17 @@ def new_order_signal(order, **kwargs):
     send_mail(f'Изменён статус заказа № {order.pk} от {order.dt.date()}',
               f'Заказ принят. Статус заказа: {order.status}',
               settings.EMAIL_HOST_USER, [order.user.email])
+
+@receiver(orders_status_changed)
+def orders_status_changed_signal(order_ids, **kwargs):
+    """
+    Отправляем каждому покупателю одно письмо со списком всех его заказов, сменивших статус
+    """
+
+    statuses = dict(STATUS_CHOICES)
+    letters = {}
+    for order in Order.objects.filter(id__in=order_ids).select_related('user').order_by('user_id', 'id'):
+        letters.setdefault(order.user.email, []).append(
+            f'Заказ № {order.pk} от {order.dt.date()}: {statuses.get(order.status, order.status)}')
+    send_mass_mail([('Изменён статус заказов', '\n'.join(lines), settings.EMAIL_HOST_USER, [email])
+                    for email, lines in letters.items()])
@@ -0,0 +1,149 @@
+import fcntl
+import hashlib
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+class SingleFlight:
+    """
+    Схлопывание одинаковых одновременных вызовов внутри процесса: функцию выполняет первый пришедший поток,
+    остальные ждут и получают его результат (или его исключение).
+    """
+
+    class Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self.Call()
+        if not leader:
+            call.event.wait()
+            if call.error:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except Exception as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+_flight = SingleFlight()
+
+
+def _cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def _try_lock(key):
+    """
+    Неблокирующая межпроцессная блокировка ключа через flock на файле рядом с общим кешем (add файлового кеша
+    не атомарен). Файлов фиксированное число: ключ попадает в одну из полос по хешу, так что их количество
+    не растёт с числом ключей; ключи одной полосы лишь ждут друг друга. Возвращает открытый файл-владелец
+    блокировки или None, если полоса уже заблокирована. Блокировка снимается закрытием файла,
+    в том числе при падении процесса.
+    """
+
+    directory = Path(getattr(settings, 'CATALOG_CACHE_LOCK_DIR', settings.BASE_DIR / '.cache' / 'locks'))
+    directory.mkdir(parents=True, exist_ok=True)
+    stripe = int(hashlib.sha1(key.encode()).hexdigest(), 16) % getattr(settings, 'CATALOG_CACHE_LOCK_STRIPES', 256)
+    file = open(directory / f'{stripe}.lock', 'a')
+    try:
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        file.close()
+        return None
+    return file
+
+
+def catalog_version():
+    return _cache().get(CATALOG_VERSION_KEY, 0)
+
+
+def bump_catalog_version():
+    """
+    Помечаем все закешированные выборки каталога устаревшими. Они продолжают отдаваться, пока пересчитываются.
+    """
+
+    cache = _cache()
+    if not cache.add(CATALOG_VERSION_KEY, 1, timeout=None):
+        try:
+            cache.incr(CATALOG_VERSION_KEY)
+        except ValueError: # ключ успели вытеснить между add и incr
+            cache.set(CATALOG_VERSION_KEY, 1, timeout=None)
+
+
+def _compute(key, func, version):
+    cache = _cache()
+    ttl = getattr(settings, 'CATALOG_CACHE_TTL', 60)
+    stale_ttl = getattr(settings, 'CATALOG_CACHE_STALE_TTL', 600)
+    value = func()
+    cache.set(key, (value, time.time() + ttl, version), ttl + stale_ttl)
+    return value
+
+
+def _revalidate(key, func, version, lock):
+    try:
+        _compute(key, func, version)
+    finally:
+        lock.close()
+        connection.close() # фоновый поток сам закрывает своё соединение с БД
+
+
+def cached_query(key, func):
+    """
+    Выполняем тяжёлый запрос каталога один раз на все одновременные одинаковые запросы.
+    Внутри процесса вызовы схлопываются через SingleFlight, между процессами - через flock на файле блокировки.
+    Устаревший результат (по TTL или после смены версии каталога) отдаётся сразу, а пересчёт запускается в фоне.
+    """
+
+    cache = _cache()
+    version = catalog_version()
+    entry = cache.get(key)
+    if entry and entry[1] > time.time() and entry[2] == version:
+        return entry[0]
+    lock_timeout = getattr(settings, 'CATALOG_CACHE_LOCK_TIMEOUT', 30)
+    if entry:
+        lock = _try_lock(key)
+        if lock:
+            threading.Thread(target=_revalidate, args=(key, func, version, lock), daemon=True).start()
+        return entry[0]
+
+    def load():
+        # пока другой процесс считает тот же запрос, ждём его результат, а не нагружаем БД повторно
+        deadline = time.monotonic() + lock_timeout
+        while not (lock := _try_lock(key)):
+            time.sleep(0.05)
+            ready = cache.get(key)
+            if ready and ready[2] == version:
+                return ready[0]
+            if time.monotonic() > deadline:
+                return func()
+        try:
+            return _compute(key, func, version)
+        finally:
+            lock.close()
+
+    return _flight.do(key, load)
@@ -1,3 +1,345 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from django.core import mail
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .feeds import fetch_feed
+from .importer import import_catalog
+from .matching import ProductMatcher, normalize, resolve_match, tokens
+from .models import Category, Contact, Order, Product, ProductInfo, ProductMatch, ProductSalesRollup, Shipment, \
+    Shop, ShopSalesRollup, User
+from .validation import FeedValidationError
+
+FEED = 'shop: Связной\ncategories: []\ngoods: []\n'.encode()
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    """Отдаёт прайс по /etag с поддержкой If-None-Match и по /plain без заголовков кеширования"""
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.path == '/etag' and self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        if self.path == '/etag':
+            self.send_header('ETag', '"v1"')
+        self.send_header('Content-Length', str(len(FEED)))
+        self.end_headers()
+        self.wfile.write(FEED)
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchFeedTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+        cls.server.requests = 0
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_first_fetch_returns_content(self):
+        feed = fetch_feed(f'{self.url}/etag')
+        self.assertEqual(feed.content, FEED)
+        self.assertEqual(feed.etag, '"v1"')
+        self.assertEqual(feed.content_hash, hashlib.sha256(FEED).hexdigest())
+
+    def test_not_modified_by_etag(self):
+        feed = fetch_feed(f'{self.url}/etag', etag='"v1"')
+        self.assertIsNone(feed.content)
+        self.assertEqual(feed.etag, '"v1"')
+
+    def test_unchanged_by_content_hash(self):
+        feed = fetch_feed(f'{self.url}/plain', content_hash=hashlib.sha256(FEED).hexdigest())
+        self.assertIsNone(feed.content)
+
+    def test_changed_content_is_returned(self):
+        feed = fetch_feed(f'{self.url}/plain', content_hash='0' * 64)
+        self.assertEqual(feed.content, FEED)
+
+
+class NormalizeTests(SimpleTestCase):
+
+    def test_units_case_and_punctuation(self):
+        self.assertEqual(normalize('Galaxy S24, 256ГБ Чёрный'), 'galaxy s24 256 gb черный')
+        self.assertEqual(normalize('Galaxy S24 256 gb черный'), normalize('galaxy-s24 256GB, Черный'))
+
+    def test_tokens_ignore_order_and_stop_words(self):
+        self.assertEqual(tokens(normalize('Чехол для iPhone 15')), tokens(normalize('iPhone 15 чехол')))
+        self.assertNotEqual(tokens(normalize('iPhone 15 Pro')), tokens(normalize('iPhone 15 Pro Max')))
+
+
+class ProductMatcherTests(TestCase):
+    """Похожие названия разных товаров уходят на проверку, автоматически связываются только равные по сути"""
+
+    PAIRS = [
+        ('iPhone XR 256GB красный', 'iPhone XS 256GB красный'),
+        ('Galaxy S10 Plus 128GB', 'Galaxy S10 128GB'),
+        ('iPhone 15 Pro Max', 'iPhone 15 Pro'),
+        ('XR 256GB черный', 'XR 256GB красный'),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Смартфоны')
+        cls.products = {name: Product.objects.create(name=name, category=cls.category) for _, name in cls.PAIRS}
+        cls.shop = Shop.objects.create(name='Связной')
+        ProductInfo.objects.create(product=cls.products['iPhone 15 Pro'], shop=cls.shop, external_id=1,
+                                   model='Apple/A3102', price=1, price_rrc=1, quantity=1)
+
+    def match(self, name, model=''):
+        return ProductMatcher({self.category.id}, 1).match(name, self.category.id, model)
+
+    def test_similar_names_go_to_review(self):
+        for name, existing in self.PAIRS:
+            with self.subTest(name=name):
+                product_id, candidate_id, score = self.match(name)
+                self.assertIsNone(product_id)
+                self.assertEqual(candidate_id, self.products[existing].id)
+                self.assertGreaterEqual(score, 0.45)
+
+    def test_same_words_are_linked(self):
+        product_id, candidate_id, _ = self.match('Galaxy S10 128 ГБ')
+        self.assertEqual((product_id, candidate_id), (self.products['Galaxy S10 128GB'].id, None))
+
+    def test_same_model_is_linked(self):
+        product_id, candidate_id, _ = self.match('Смартфон Apple iPhone 15 Pro 256GB', 'apple a3102')
+        self.assertEqual((product_id, candidate_id), (self.products['iPhone 15 Pro'].id, None))
+
+    def test_dissimilar_name_is_new(self):
+        self.assertEqual(self.match('Чайник Bosch')[:2], (None, None))
+
+    def test_decisions(self):
+        candidate = self.products['iPhone XS 256GB красный']
+        new = Product.objects.create(name='iPhone XR 256GB красный', category=self.category)
+        match = ProductMatch.objects.create(shop=self.shop, category=self.category, name='iPhone XR 256GB красный',
+                                            product=new, candidate=candidate, score=0.9, state='rejected')
+        self.assertEqual(self.match('iPhone XR 256GB красный')[:2], (new.id, None)) # точное название
+        new.delete()
+        self.assertEqual(self.match('iPhone XR 256GB красный')[:2], (None, None))
+        ProductMatch.objects.filter(id=match.id).update(state='accepted')
+        self.assertEqual(self.match('iPhone XR 256GB красный')[:2], (candidate.id, None))
+
+
+class ResolveMatchTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Смартфоны')
+        self.candidate = Product.objects.create(name='iPhone XS 256GB красный', category=self.category)
+        self.product = Product.objects.create(name='iPhone XS 256 ГБ (красный)', category=self.category)
+        users = [User.objects.create_user(f'{name}@example.ru', 'pw', username=name, phone=name, type='seller')
+                 for name in ('first', 'second')]
+        self.first, self.second = [Shop.objects.create(name=user.username, user=user) for user in users]
+        self.offer = ProductInfo.objects.create(product=self.product, shop=self.second, external_id=7, price=1,
+                                                price_rrc=1, quantity=1)
+        ProductInfo.objects.create(product=self.candidate, shop=self.first, external_id=7, price=1, price_rrc=1,
+                                   quantity=1)
+        ProductSalesRollup.objects.create(shop=self.second, product=self.product, day='2026-01-01', revenue=10,
+                                          units=1, orders_count=1)
+        ProductSalesRollup.objects.create(shop=self.second, product=self.candidate, day='2026-01-01', revenue=5,
+                                          units=2, orders_count=1)
+        self.match = ProductMatch.objects.create(shop=self.second, category=self.category, name=self.product.name,
+                                                 product=self.product, candidate=self.candidate, score=0.6)
+
+    def test_accept_moves_offers_and_deletes_product(self):
+        self.assertEqual(resolve_match(self.match.id, True), 'accepted')
+        self.offer.refresh_from_db()
+        self.assertEqual(self.offer.product_id, self.candidate.id)
+        self.assertFalse(Product.objects.filter(id=self.product.id).exists())
+        self.match.refresh_from_db()
+        self.assertEqual((self.match.state, self.match.product_id), ('accepted', None))
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.product_count, 1)
+        self.assertEqual(list(ProductSalesRollup.objects.values_list('product_id', 'revenue', 'units', 'orders_count')),
+                         [(self.candidate.id, 15, 3, 2)])
+        self.assertIsNone(resolve_match(self.match.id, True))
+
+    def test_reject_keeps_product(self):
+        self.assertEqual(resolve_match(self.match.id, False), 'rejected')
+        self.offer.refresh_from_db()
+        self.assertEqual(self.offer.product_id, self.product.id)
+
+    def test_same_offer_of_shop_is_conflict(self):
+        ProductInfo.objects.filter(shop=self.first).update(shop=self.second)
+        self.assertEqual(resolve_match(self.match.id, True), 'conflict')
+        self.match.refresh_from_db()
+        self.assertEqual(self.match.state, 'new')
+        self.assertTrue(Product.objects.filter(id=self.product.id).exists())
+
+
+class ImportCategoryTreeTests(TestCase):
+
+    def setUp(self):
+        users = [User.objects.create_user(f'{name}@example.ru', 'pw', username=name, phone=name, type='seller')
+                 for name in ('first', 'second')]
+        self.first, self.second = users
+        self.root = Category.objects.create(id=1, name='Электроника')
+        self.child = Category.objects.create(id=2, name='Смартфоны', parent=self.root)
+
+    def feed(self, shop, categories):
+        return {'shop': shop, 'categories': categories, 'goods': [
+            {'id': 1, 'category': categories[0]['id'], 'name': 'iPhone 15', 'price': 100, 'price_rrc': 110,
+             'quantity': 1, 'parameters': {}}]}
+
+    def test_cycle_through_database_is_rejected(self):
+        feed = self.feed('Связной', [{'id': 1, 'name': 'Электроника', 'parent': 2}, {'id': 2, 'name': 'Смартфоны'}])
+        with self.assertRaises(FeedValidationError) as raised:
+            import_catalog(feed, self.first.id, reindex=False)
+        self.assertIn('categories[1]', raised.exception.errors)
+        self.assertFalse(Shop.objects.exists())
+        self.root.refresh_from_db()
+        self.assertIsNone(self.root.parent_id)
+
+    def test_swap_within_own_branch(self):
+        feed = self.feed('Связной', [{'id': 1, 'name': 'Электроника', 'parent': 2},
+                                     {'id': 2, 'name': 'Смартфоны', 'parent': None}])
+        import_catalog(feed, self.first.id, reindex=False)
+        self.root.refresh_from_db()
+        self.child.refresh_from_db()
+        self.assertEqual((self.child.path, self.root.path), ('/2/', '/2/1/'))
+
+    def test_shared_branch_is_not_moved(self):
+        import_catalog(self.feed('Связной', [{'id': 2, 'name': 'Смартфоны'}]), self.first.id, reindex=False)
+        Category.objects.create(id=3, name='Аксессуары')
+        feed = self.feed('Евросеть', [{'id': 2, 'name': 'Смартфоны', 'parent': 3}, {'id': 3, 'name': 'Аксессуары'}])
+        import_catalog(feed, self.second.id, reindex=False)
+        self.child.refresh_from_db()
+        self.assertEqual(self.child.path, '/1/2/')
+
+
+class CheckoutTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Смартфоны')
+        product = Product.objects.create(name='iPhone 15', category=category)
+        cls.sellers, cls.offers = [], []
+        for number, price in enumerate((100, 90), start=1):
+            seller = User.objects.create_user(f'seller{number}@example.ru', 'pw', username=f'seller{number}',
+                                              phone=f'seller{number}', type='seller', is_active=True)
+            shop = Shop.objects.create(name=f'Магазин {number}', user=seller)
+            cls.sellers.append(seller)
+            cls.offers.append(ProductInfo.objects.create(product=product, shop=shop, external_id=number, price=price,
+                                                         price_rrc=price, quantity=10))
+        cls.buyer = User.objects.create_user('buyer@example.ru', 'pw', username='buyer', phone='buyer',
+                                             is_active=True)
+        cls.contact = Contact.objects.create(user=cls.buyer, region='r', city='c', street='s', house='1')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def checkout(self):
+        client = self.client_for(self.buyer)
+        client.post(reverse('backend:market-basket'), {'items': json.dumps([
+            {'product_info': self.offers[0].id, 'quantity': 2}, {'product_info': self.offers[1].id, 'quantity': 1}])})
+        response = client.post(reverse('backend:market-orders'), {'contact_id': self.contact.id})
+        self.assertEqual(response.status_code, 200)
+        return Order.objects.exclude(status='basket').latest('id')
+
+
+class SalesRollupTests(CheckoutTestCase):
+
+    def totals(self):
+        return sorted(ShopSalesRollup.objects.values_list('shop__user_id', 'revenue', 'units', 'orders_count'))
+
+    def test_checkout_adds_sales_at_checkout_price(self):
+        self.checkout()
+        ProductInfo.objects.filter(id=self.offers[0].id).update(price=500) # цена после оформления не учитывается
+        self.assertEqual(self.totals(), [(self.sellers[0].id, 200, 2, 1), (self.sellers[1].id, 90, 1, 1)])
+        self.assertEqual(ProductSalesRollup.objects.filter(shop__user=self.sellers[0]).get().revenue, 200)
+
+    def test_cancel_subtracts_only_own_shipment(self):
+        order = self.checkout()
+        response = self.client_for(self.sellers[1]).post(reverse('backend:seller-orders-status'),
+                                                          {'status': 'canceled', 'orders': [order.id]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.totals(), [(self.sellers[0].id, 200, 2, 1), (self.sellers[1].id, 0, 0, 0)])
+
+    def test_backfill_matches_incremental_rollups(self):
+        order = self.checkout()
+        self.client_for(self.sellers[1]).post(reverse('backend:seller-orders-status'),
+                                              {'status': 'canceled', 'orders': [order.id]}, format='json')
+        self.checkout()
+        incremental = [row for row in self.totals() if row[1]]
+        call_command('backfill_sales', stdout=io.StringIO())
+        self.assertEqual(self.totals(), incremental)
+
+
+class OrderTransitionTests(CheckoutTestCase):
+
+    def setUp(self):
+        self.order = self.checkout()
+        mail.outbox = []
+
+    def transition(self, user, status, orders):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client_for(user).post(reverse('backend:seller-orders-status'),
+                                              {'status': status, 'orders': orders}, format='json')
+
+    def shipment_statuses(self, order):
+        return dict(Shipment.objects.filter(order=order).values_list('shop__user_id', 'status'))
+
+    def test_forbidden_transition_changes_nothing(self):
+        response = self.transition(self.sellers[0], 'finish', [self.order.id])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.order.id), response.json()['Errors'])
+        self.assertEqual(set(self.shipment_statuses(self.order).values()), {'new'})
+        self.assertEqual(mail.outbox, [])
+
+    def test_seller_moves_only_own_shipment(self):
+        response = self.transition(self.sellers[0], 'delivery', [self.order.id])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.shipment_statuses(self.order),
+                         {self.sellers[0].id: 'delivery', self.sellers[1].id: 'new'})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'new') # статус заказа - по самому отстающему отправлению
+        self.assertEqual(mail.outbox, [])
+
+    def test_foreign_order_is_not_found(self):
+        other = User.objects.create_user('other@example.ru', 'pw', username='other', phone='other', type='seller',
+                                         is_active=True)
+        response = self.transition(other, 'delivery', [self.order.id])
+        self.assertEqual(response.json()['Errors'], {str(self.order.id): 'Заказ не найден'})
+
+    def test_order_status_derived_from_mixed_shipments(self):
+        self.transition(self.sellers[0], 'delivery', [self.order.id])
+        self.transition(self.sellers[1], 'canceled', [self.order.id])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'delivery')
+        self.transition(self.sellers[0], 'canceled', [self.order.id])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'canceled')
+
+    def test_staff_moves_all_shipments_and_mails_buyer_once(self):
+        second = self.checkout()
+        mail.outbox = []
+        staff = User.objects.create_user('staff@example.ru', 'pw', username='staff', phone='staff', is_staff=True,
+                                         is_active=True)
+        response = self.transition(staff, 'delivery', [self.order.id, second.id])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(Order.objects.filter(id__in=[self.order.id, second.id]).values_list('status', flat=True)),
+                         {'delivery'})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.buyer.email])
+        self.assertIn(f'№ {self.order.id}', mail.outbox[0].body)
+        self.assertIn(f'№ {second.id}', mail.outbox[0].body)
@@ -0,0 +1,40 @@
+import hashlib
+import threading
+from collections import Counter
+
+from django.core.cache import caches
+from rest_framework.throttling import AnonRateThrottle, SimpleRateThrottle
+
+throttled = Counter() # отказы по областям ограничения в пределах процесса
+_throttled_lock = threading.Lock()
+
+
+class CountingThrottleMixin:
+    """Учёт отклонённых запросов для мониторинга"""
+
+    cache = caches['default']
+
+    def allow_request(self, request, view):
+        allowed = super().allow_request(request, view)
+        if not allowed:
+            with _throttled_lock:
+                throttled[self.scope] += 1
+        return allowed
+
+
+class TokenRateThrottle(CountingThrottleMixin, SimpleRateThrottle):
+    """
+    Ограничение частоты запросов по токену аутентификации (DEFAULT_THROTTLE_RATES['token'])
+    """
+
+    scope = 'token'
+
+    def get_cache_key(self, request, view):
+        if request.auth is None:
+            return None # анонимов ограничивает AnonymousRateThrottle
+        key = hashlib.sha256(str(request.auth).encode()).hexdigest()[:32]
+        return self.cache_format % {'scope': self.scope, 'ident': key}
+
+
+class AnonymousRateThrottle(CountingThrottleMixin, AnonRateThrottle):
+    """Ограничение частоты анонимных запросов по IP (DEFAULT_THROTTLE_RATES['anon'])"""
@@ -0,0 +1,67 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django_rest_passwordreset.models import ResetPasswordToken
+from rest_framework.authtoken.models import Token
+
+from .models import ConfirmEmailToken
+
+# Вид токена: модель и поле с датой создания
+TOKEN_KINDS = {
+    'confirm_email': (ConfirmEmailToken, 'created_at'),
+    'auth': (Token, 'created'),
+    'password_reset': (ResetPasswordToken, 'created_at'),
+}
+PRUNE_STATS_KEY = 'tokens:prune'
+
+
+def token_ttl(kind):
+    ttl_hours = {'confirm_email': 72, 'auth': 24 * 30, 'password_reset': 24}
+    ttl_hours.update(getattr(settings, 'TOKEN_TTL_HOURS', {}))
+    return timedelta(hours=ttl_hours[kind])
+
+
+def expired_before(kind):
+    """Токены этого вида, созданные раньше возвращаемого момента, просрочены"""
+    return timezone.now() - token_ttl(kind)
+
+
+def is_expired(kind, created):
+    return created < expired_before(kind)
+
+
+def table_sizes():
+    return {kind: model.objects.count() for kind, (model, _) in TOKEN_KINDS.items()}
+
+
+def prune_expired(batch_size=500, pause=0.0):
+    """
+    Удаляем просроченные токены всех видов небольшими порциями: каждая порция - отдельный короткий DELETE
+    по первичным ключам, между порциями пауза pause секунд, чтобы не держать долгие блокировки.
+    Возвращает по видам число удалённых строк, длительность и скорость удаления, итог сохраняется для мониторинга.
+    """
+
+    stats = {}
+    for kind, (model, field) in TOKEN_KINDS.items():
+        before = expired_before(kind)
+        deleted, started = 0, time.monotonic()
+        while True:
+            keys = list(model.objects.filter(**{f'{field}__lt': before}).values_list('pk', flat=True)[:batch_size])
+            if not keys:
+                break
+            deleted += model.objects.filter(pk__in=keys, **{f'{field}__lt': before}).delete()[0]
+            if pause:
+                time.sleep(pause)
+        seconds = time.monotonic() - started
+        stats[kind] = {'deleted': deleted, 'seconds': round(seconds, 3),
+                       'rate': round(deleted / seconds, 1) if seconds else 0.0}
+    caches['shared'].set(PRUNE_STATS_KEY, {'finished_at': timezone.now().isoformat(), 'kinds': stats}, None)
+    return stats
+
+
+def last_prune():
+    """Итог последнего запуска очистки или None, если очистка ещё не запускалась"""
+    return caches['shared'].get(PRUNE_STATS_KEY)
@@ -0,0 +1,44 @@
+from django.db import transaction
+
+from .analytics import apply_shipments
+from .events import record_events
+from .models import Shipment, ORDER_TRANSITIONS
+from .shipments import sync_order_statuses
+from .signals import orders_status_changed
+
+
+def transition_orders(order_ids, status, user):
+    """
+    Массовый перевод заказов в новый статус.
+    Меняются статусы отправлений: продавец двигает только отправления своего магазина, сотрудник - все
+    отправления заказа, для которых переход допустим. Статус заказа затем пересчитывается по отправлениям.
+    Все отправления блокируются и проверяются по таблице переходов, при любой ошибке не меняется ни одно.
+    Возвращает словарь ошибок по id заказов (пустой при успехе).
+    """
+
+    order_ids = set(order_ids)
+    with transaction.atomic():
+        shipments = Shipment.objects.select_for_update().filter(order_id__in=order_ids)
+        if not user.is_staff:
+            shipments = shipments.filter(shop__user_id=user.id)
+        found = {}
+        for shipment_id, order_id, current in shipments.values_list('id', 'order_id', 'status'):
+            found.setdefault(order_id, []).append((shipment_id, current))
+        errors = {order_id: 'Заказ не найден' for order_id in order_ids - found.keys()}
+        moving = []
+        for order_id, items in found.items():
+            allowed = [shipment_id for shipment_id, current in items if status in ORDER_TRANSITIONS.get(current, ())]
+            if not allowed or not user.is_staff and len(allowed) < len(items):
+                current = ', '.join(sorted({current for _, current in items}))
+                errors[order_id] = f'Переход из статуса "{current}" в "{status}" недопустим'
+            moving.extend(allowed)
+        if errors:
+            return errors
+        Shipment.objects.filter(id__in=moving).update(status=status) # один UPDATE на всю пачку
+        if status == 'canceled':
+            apply_shipments(moving, sign=-1) # отменённые отправления вычитаем из витрин продаж
+        changed = sync_order_statuses(order_ids)
+        record_events('status', Shipment.objects.filter(id__in=moving))
+        if changed: # письмо покупателю - только если сменился статус самого заказа, а не одного из отправлений
+            transaction.on_commit(lambda: orders_status_changed.send(sender=transition_orders, order_ids=changed))
+    return {}
@@ -1,22 +1,39 @@
 from django.urls import path
 from django_rest_passwordreset.views import reset_password_request_token, reset_password_confirm
 from .views import RegisterAccount, ConfirmAccount, LoginAccount, PartnerUpdate, ShopView, CategoryView, \
-    ProductInfoView, OpenCloseShop, BasketView, ContactView, OrderView, SellerOrdersView
+    ResendConfirmation, ProductInfoView, OpenCloseShop, BasketView, ContactView, OrderView, SellerOrdersView, \
+    SellerAnalyticsView, OrderStatusView, PartnerOffersView, AdmissionStatsView, BatchView, \
+    ProfilesView, TokenStatsView, OrderEventsView, RelatedProductsView, \
+    AutocompleteView, PartnerValidateView, ProductMatchesView
 
 app_name = 'backend'
 urlpatterns = [
     path('user/register', RegisterAccount.as_view(), name='user-register'),
     path('user/confirm', ConfirmAccount.as_view(), name='user-confirm'),
+    path('user/confirm/resend', ResendConfirmation.as_view(), name='user-confirm-resend'),
     path('user/login', LoginAccount.as_view(), name='user-login'),
     path('user/password_reset', reset_password_request_token, name='user-password-reset'),
     path('user/password_reset/confirm', reset_password_confirm, name='user-password-reset-confirm'),
+    path('user/events', OrderEventsView.as_view(), name='user-events'),
     path('user/contacts', ContactView.as_view(), name='user-contacts'),
     path('seller/update', PartnerUpdate.as_view(), name='seller-update'),
+    path('seller/update/validate', PartnerValidateView.as_view(), name='seller-update-validate'),
+    path('seller/offers', PartnerOffersView.as_view(), name='seller-offers'),
     path('seller/timeout', OpenCloseShop.as_view(), name='seller-timeout'),
     path('seller/orders', SellerOrdersView.as_view(), name='seller-orders'),
+    path('seller/orders/status', OrderStatusView.as_view(), name='seller-orders-status'),
+    path('seller/analytics', SellerAnalyticsView.as_view(), name='seller-analytics'),
     path('market/shops', ShopView.as_view(), name='market-shops'),
     path('market/categories', CategoryView.as_view(), name='market-categories'),
     path('market/products', ProductInfoView.as_view(), name='market-products'),
+    path('market/products/<int:product_id>/related', RelatedProductsView.as_view(), name='market-product-related'),
+    path('market/autocomplete', AutocompleteView.as_view(), name='market-autocomplete'),
     path('market/basket', BasketView.as_view(), name='market-basket'),
     path('market/orders', OrderView.as_view(), name='market-orders'),
+    path('batch', BatchView.as_view(), name='batch'),
+    path('service/admission', AdmissionStatsView.as_view(), name='service-admission'),
+    path('service/tokens', TokenStatsView.as_view(), name='service-tokens'),
+    path('service/matches', ProductMatchesView.as_view(), name='service-matches'),
+    path('service/profiles', ProfilesView.as_view(), name='service-profiles'),
+    path('service/profiles/<str:url_name>/<str:name>', ProfilesView.as_view(), name='service-profile'),
 ]
@@ -0,0 +1,161 @@
+from numbers import Real
+
+MAX_INT = 2 ** 31 - 1 # верхняя граница PositiveIntegerField
+
+# Схема прайса: поля строк разделов categories и goods. Описание компилируется в функции проверки один раз
+# при импорте модуля, ограничения длины строк повторяют max_length полей моделей.
+FEED_SCHEMA = {
+    'categories': {
+        'id': {'type': int, 'required': True, 'min': 0, 'max': MAX_INT},
+        'name': {'type': str, 'required': True, 'max_length': 50},
+        'parent': {'type': int, 'min': 0, 'max': MAX_INT},
+    },
+    'goods': {
+        'id': {'type': int, 'required': True, 'min': 0, 'max': MAX_INT},
+        'category': {'type': int, 'required': True, 'min': 0, 'max': MAX_INT},
+        'model': {'type': str, 'max_length': 80},
+        'name': {'type': str, 'required': True, 'max_length': 100},
+        'price': {'type': int, 'required': True, 'min': 0, 'max': MAX_INT},
+        'price_rrc': {'type': int, 'required': True, 'min': 0, 'max': MAX_INT},
+        'quantity': {'type': int, 'required': True, 'min': 0, 'max': MAX_INT},
+        'parameters': {'type': dict, 'key_length': 50, 'value_length': 100},
+    },
+}
+SHOP_NAME_LENGTH = 50
+
+
+class FeedValidationError(ValueError):
+    """Прайс не прошёл проверку: errors - ошибки по строкам, stats - размеры разделов и общее число ошибок"""
+
+    def __init__(self, errors, stats):
+        super().__init__(errors, stats)
+        self.errors, self.stats = errors, stats
+
+    def __str__(self):
+        where, messages = next(iter(self.errors.items()))
+        return f'прайс не прошёл проверку, ошибок: {self.stats["errors"]}, первая: {where}: {messages[0]}'
+
+
+def _compile_field(name, rule):
+    """Функция проверки одного поля строки: возвращает текст ошибки или None"""
+    kind, required = rule['type'], rule.get('required', False)
+    low, high, max_length = rule.get('min'), rule.get('max'), rule.get('max_length')
+    key_length, value_length = rule.get('key_length'), rule.get('value_length')
+
+    def check(row):
+        value = row.get(name)
+        if value is None:
+            return f'Не заполнено поле {name}' if required else None
+        if kind is int:
+            if type(value) is not int: # bool - подкласс int, но в прайсе это ошибка
+                return f'Поле {name} должно быть целым числом'
+            if low is not None and value < low or high is not None and value > high:
+                return f'Поле {name} должно быть в диапазоне от {low} до {high}'
+        elif kind is str:
+            if not isinstance(value, (str, int, float)) or isinstance(value, bool) or not str(value).strip():
+                return f'Поле {name} должно быть непустой строкой'
+            if max_length and len(str(value)) > max_length:
+                return f'Поле {name} длиннее {max_length} символов'
+        elif kind is dict:
+            if not isinstance(value, dict):
+                return f'Поле {name} должно быть словарём'
+            for key, item in value.items():
+                if not isinstance(key, str) or not key.strip() or len(key) > key_length:
+                    return f'Название характеристики {key!r} должно быть непустой строкой до {key_length} символов'
+                if isinstance(item, bool) or not isinstance(item, (str, Real)) or len(str(item)) > value_length:
+                    return f'Значение характеристики {key!r} должно быть строкой или числом до {value_length} символов'
+        return None
+
+    return check
+
+
+def _compile_section(fields):
+    checks = [_compile_field(name, rule) for name, rule in fields.items()]
+
+    def check(row):
+        if not isinstance(row, dict):
+            return ['Строка должна быть объектом с полями ' + ', '.join(fields)]
+        return [error for error in (check_field(row) for check_field in checks) if error]
+
+    return check
+
+
+CHECKS = {section: _compile_section(fields) for section, fields in FEED_SCHEMA.items()}
+
+
+def validate_feed(data, max_errors=100):
+    """
+    Проверка разобранного прайса за один проход без обращения к БД: схема полей и диапазоны значений,
+    уникальность id категорий и external_id товаров, ссылки товаров и родительских категорий на категории прайса,
+    отсутствие циклов в дереве категорий.
+    Возвращает (ошибки {'goods[3]': [...]}, не больше max_errors строк; статистика с общим числом ошибок).
+    """
+
+    errors, total = {}, 0
+
+    def report(where, messages):
+        nonlocal total
+        total += len(messages)
+        if len(errors) < max_errors:
+            errors.setdefault(where, []).extend(messages)
+
+    if not isinstance(data, dict):
+        report('feed', ['Прайс должен быть объектом с ключами shop, categories, goods'])
+        return errors, {'categories': 0, 'goods': 0, 'errors': total}
+    shop = data.get('shop')
+    if not isinstance(shop, str) or not shop.strip() or len(shop) > SHOP_NAME_LENGTH:
+        report('shop', [f'Название магазина должно быть непустой строкой до {SHOP_NAME_LENGTH} символов'])
+    sections = {}
+    for section in FEED_SCHEMA:
+        rows = data.get(section)
+        if not isinstance(rows, list):
+            report(section, [f'Раздел {section} должен быть списком'])
+            rows = []
+        sections[section] = rows
+
+    categories, parents = {}, []
+    for number, row in enumerate(sections['categories'], start=1):
+        messages = CHECKS['categories'](row)
+        category_id = row.get('id') if isinstance(row, dict) else None
+        if type(category_id) is int: # ссылки проверяем и для строк с ошибками в других полях
+            if category_id in categories:
+                messages.append(f'Категория {category_id} повторяет категорию из строки {categories[category_id]}')
+            categories.setdefault(category_id, number)
+            if type(row.get('parent')) is int:
+                parents.append((number, category_id, row['parent']))
+        if messages:
+            report(f'categories[{number}]', messages)
+    links = {category_id: parent_id for _, category_id, parent_id in parents}
+    for number, category_id, parent_id in parents:
+        if parent_id not in categories:
+            report(f'categories[{number}]', [f'Родительская категория {parent_id} не описана в прайсе'])
+            continue
+        chain = {category_id}
+        while parent_id in links and parent_id not in chain: # поднимаемся по предкам, описанным в прайсе
+            chain.add(parent_id)
+            parent_id = links[parent_id]
+        if parent_id in chain:
+            report(f'categories[{number}]', ['Категория оказывается собственным предком'])
+
+    goods = {}
+    for number, row in enumerate(sections['goods'], start=1):
+        messages = CHECKS['goods'](row)
+        if isinstance(row, dict):
+            external_id, category_id = row.get('id'), row.get('category')
+            if type(external_id) is int:
+                if external_id in goods:
+                    messages.append(f'external_id {external_id} повторяет товар из строки {goods[external_id]}')
+                goods.setdefault(external_id, number)
+            if type(category_id) is int and category_id not in categories:
+                messages.append(f'Категория {category_id} не описана в прайсе')
+        if messages:
+            report(f'goods[{number}]', messages)
+    return errors, {'categories': len(sections['categories']), 'goods': len(sections['goods']), 'errors': total}
+
+
+def check_feed(data):
+    """Проверка перед импортом: исключение FeedValidationError, если в прайсе есть ошибки"""
+    errors, stats = validate_feed(data)
+    if errors:
+        raise FeedValidationError(errors, stats)
+    return stats
@@ -1,25 +1,52 @@
 from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from django.core.signals import request_started
 from django.core.validators import URLValidator
-from django.db import IntegrityError
-from django.db.models import Q, Sum, F
-from django.http import JsonResponse
+from django.utils.dateparse import parse_date
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Sum, F, Prefetch
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.http import JsonResponse, FileResponse, StreamingHttpResponse
+from django.views import View
 from rest_framework.response import Response
 from django.shortcuts import render
 from rest_framework.generics import ListAPIView
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
-from requests import get
-from yaml import load, Loader
+from rest_framework.exceptions import AuthenticationFailed
+from requests import RequestException
+from yaml import YAMLError
 from ujson import loads as load_json
 
-from .models import ConfirmEmailToken, Category, Shop, ProductInfo, Product, Parameter, ProductParameter, Order, \
-    OrderItem, Contact
+from .models import User, ConfirmEmailToken, Category, Shop, ProductInfo, Order, OrderItem, Contact, \
+    FeedState, Shipment, STATUS_CHOICES
 from .serializers import UserSerializer, CategorySerializer, ShopSerializer, ProductInfoSerializer, OrderSerializer, \
-    OrderItemSerializer, ContactSerializer
-from .signals import new_order
+    OrderItemSerializer, ContactSerializer, ShipmentSerializer
+from .signals import new_order, send_confirmation
+from .analytics import PERIODS, apply_orders, shop_sales
+from .transitions import transition_orders
+from .shipments import create_shipments, fix_prices
+from .baskets import cached_basket, invalidate_baskets, touch_basket
+from .autocomplete import autocomplete
+from .events import event_stream, get_poller, last_event_id, record_events
+from .authentication import ExpiringTokenAuthentication
+from .archive import archived_orders, archived_shipments
+from .offers import parse_offers, patch_offers, read_csv
+from .validation import FeedValidationError, validate_feed
+from .feeds import fetch_feed, parse_feed
+from .importer import import_catalog
+from .matching import pending_matches, resolve_match
+from .categories import subtree_path
+from .counters import apply_category_deltas, shop_category_counts
+from .singleflight import cached_query, bump_catalog_version
+from .middleware import get_gates
+from .throttling import throttled
+from .batch import run_batch, BATCH_METHODS
+from .profiling import list_profiles, profile_path
+from .tokens import expired_before, is_expired, last_prune, table_sizes
 
 
 class RegisterAccount(APIView):
@@ -40,9 +67,8 @@ class RegisterAccount(APIView):
             else:
                 user_serializer = UserSerializer(data=request.data)
                 if user_serializer.is_valid():
-                    user = user_serializer.save()
-                    user.set_password(request.data['password']) # солим и прячем пароль
-                    user.save()
+                    # пароль хешируем до сохранения, чтобы пользователь записывался одним INSERT
+                    user_serializer.save(password=make_password(request.data['password']))
                     return JsonResponse({'Status': 'Аккаунт зарегистрирован. Пожалуйста, подтвердите Вашу почту'})
                 else:
                     return JsonResponse({'Status': False, 'Errors': user_serializer.errors})
@@ -57,8 +83,8 @@ class ConfirmAccount(APIView):
 
     def post(self, request):
         if {'email', 'token'}.issubset(request.data):
-            token = ConfirmEmailToken.objects.filter(user__email=request.data['email'],
-                                                     key=request.data['token']).first()
+            token = ConfirmEmailToken.objects.filter(user__email=request.data['email'], key=request.data['token'],
+                                                     created_at__gte=expired_before('confirm_email')).first()
             if token:
                 token.user.is_active = True
                 token.user.save()
@@ -70,6 +96,23 @@ class ConfirmAccount(APIView):
         return JsonResponse({'Status': False, 'Errors': 'Не переданы токен и/или email'})
 
 
+class ResendConfirmation(APIView):
+    """
+    Класс для повторной отправки токена подтверждения почты, если прежний просрочен и удалён очисткой
+    """
+
+    def post(self, request):
+        if 'email' in request.data:
+            user = User.objects.filter(email__iexact=str(request.data['email']).strip(), is_active=False).first()
+            if user:
+                with transaction.atomic():
+                    send_confirmation(user, replace=True)
+            # ответ не зависит от того, зарегистрирован ли адрес
+            return JsonResponse({'Status': 'Если адрес зарегистрирован и не подтверждён, на него отправлен токен'})
+
+        return JsonResponse({'Status': False, 'Errors': 'Не передан email'})
+
+
 class LoginAccount(APIView):
     """
     Класс для аутентификации пользователей
@@ -81,6 +124,9 @@ class LoginAccount(APIView):
             if user:
                 if user.is_active:
                     token, _ = Token.objects.get_or_create(user=user)
+                    if is_expired('auth', token.created): # просроченный токен заменяем новым
+                        token.delete()
+                        token = Token.objects.create(user=user)
                     return JsonResponse({'Status': True, 'Token': token.key})
                 return JsonResponse({'Status': False, 'Error': 'Требуется подтверждение электронной почты'})
             return JsonResponse({'Status': False, 'Error': 'Аутентификация неуспешна. Проверьте вводимые данные'})
@@ -103,29 +149,37 @@ class PartnerUpdate(APIView):
                     except ValidationError as err:
                         return JsonResponse({'Status': False, 'Error': str(err)})
                     else:
-                        stream = get(url).content
-                        data = load(stream, Loader=Loader)
-                        shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=request.user.id)
-                        for category in data['categories']:
-                            cat, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-                            cat.shops.add(shop.id)
-                            cat.save()
-                        ProductInfo.objects.filter(shop_id=shop.id).delete()
-                        for item in data['goods']:
-                            product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
-                            product_info = ProductInfo.objects.create(product_id=product.id,
-                                                                      external_id=item['id'],
-                                                                      model=item['model'],
-                                                                      price=item['price'],
-                                                                      price_rrc=item['price_rrc'],
-                                                                      quantity=item['quantity'],
-                                                                      shop_id=shop.id)
-                            for name, value in item['parameters'].items():
-                                param, _ = Parameter.objects.get_or_create(name=name)
-                                ProductParameter.objects.create(product_info_id=product_info.id,
-                                                                parameter_id=param.id,
-                                                                value=value)
-                        return JsonResponse({'Status': 'Каталог обновлён'})
+                        # условный запрос по данным прошлой загрузки, force позволяет принудительно перезагрузить прайс
+                        state = FeedState.objects.filter(shop__user_id=request.user.id, url=url).first()
+                        if state and not request.data.get('force'):
+                            conditions = (state.etag, state.last_modified, state.content_hash)
+                        else:
+                            conditions = ()
+                        try:
+                            feed = fetch_feed(url, *conditions)
+                        except RequestException as err:
+                            return JsonResponse({'Status': False, 'Error': f'Не удалось загрузить прайс: {err}'},
+                                                status=502)
+                        if feed.content is None:
+                            FeedState.objects.filter(id=state.id).update(etag=feed.etag,
+                                                                         last_modified=feed.last_modified)
+                            return JsonResponse({'Status': 'Каталог не изменился', 'Skipped': True})
+                        try:
+                            data = parse_feed(feed.content)
+                        except YAMLError as err:
+                            return JsonResponse({'Status': False, 'Error': f'Ошибка разбора прайса: {err}'},
+                                                status=400)
+                        errors, stats = validate_feed(data)
+                        if errors: # прайс с ошибками не импортируем, состояние загрузки не меняем
+                            return JsonResponse({'Status': False, 'Errors': errors, 'Stats': stats}, status=400)
+                        try:
+                            shop, _ = import_catalog(data, request.user.id)
+                        except FeedValidationError as err: # конфликт с деревом категорий в БД
+                            return JsonResponse({'Status': False, 'Errors': err.errors, 'Stats': err.stats}, status=400)
+                        FeedState.objects.update_or_create(shop=shop, defaults={
+                            'url': url, 'etag': feed.etag, 'last_modified': feed.last_modified,
+                            'content_hash': feed.content_hash, 'imported_at': timezone.now()})
+                        return JsonResponse({'Status': 'Каталог обновлён', 'Skipped': False})
                 return JsonResponse({'Status': False, 'Error': 'Не передана ссылка на файл обновления'},
                                     status=400)
             return JsonResponse({'Status': False, 'Error': 'Обновление прайса доступно только для продавцов'},
@@ -134,14 +188,94 @@ class PartnerUpdate(APIView):
                             status=401)
 
 
+class PartnerValidateView(APIView):
+    """
+    Класс для пробной проверки прайса без загрузки в каталог: прайс передаётся ссылкой в поле url
+    или YAML в теле запроса (Content-Type application/x-yaml или text/yaml). БД не изменяется.
+    """
+
+    def post(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            if request.user.type == 'seller':
+                if request.content_type in ('application/x-yaml', 'application/yaml', 'text/yaml'):
+                    content = request.body
+                else:
+                    url = request.data.get('url')
+                    if not url:
+                        return JsonResponse({'Status': False, 'Error': 'Передайте ссылку на прайс или YAML в теле '
+                                                                       'запроса'}, status=400)
+                    try:
+                        URLValidator()(url)
+                    except ValidationError as err:
+                        return JsonResponse({'Status': False, 'Error': str(err)}, status=400)
+                    try:
+                        content = fetch_feed(url).content
+                    except RequestException as err:
+                        return JsonResponse({'Status': False, 'Error': f'Не удалось загрузить прайс: {err}'},
+                                            status=502)
+                try:
+                    data = parse_feed(content)
+                except YAMLError as err:
+                    return JsonResponse({'Status': False, 'Error': f'Ошибка разбора прайса: {err}'}, status=400)
+                errors, stats = validate_feed(data)
+                return JsonResponse({'Status': not errors, 'Errors': errors, 'Stats': stats})
+            return JsonResponse({'Status': False, 'Error': 'Обновление прайса доступно только для продавцов'},
+                                status=403)
+        return JsonResponse({'Status': False, 'Error': 'Не пройдена аутентификация. Пожалуйста, представьтесь'},
+                            status=401)
+
+
+class PartnerOffersView(APIView):
+    """
+    Класс для точечного обновления цен и остатков магазина по external_id без загрузки всего прайса.
+    Принимает JSON-список строк {external_id, price, price_rrc, quantity} в поле items или телом запроса,
+    либо CSV с тем же заголовком.
+    """
+
+    def post(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            if request.user.type == 'seller':
+                shop = Shop.objects.filter(user_id=request.user.id).first()
+                if not shop:
+                    return JsonResponse({'Status': False, 'Error': 'Магазин продавца не найден'}, status=404)
+                try:
+                    if request.content_type.startswith('text/csv'):
+                        rows = read_csv(request.body)
+                    else:
+                        rows = request.data # список строк телом запроса или в поле items
+                        if not isinstance(rows, list):
+                            rows = rows.get('items') if hasattr(rows, 'get') else None
+                        rows = load_json(rows) if isinstance(rows, str) else rows
+                except ValueError:
+                    rows = None
+                if not isinstance(rows, list) or not rows:
+                    return JsonResponse({'Status': False, 'Error': 'Неверный формат запроса. Передайте список строк '
+                                                                   'с external_id, ценами и количеством'}, status=400)
+                offers, errors = parse_offers(rows)
+                if errors:
+                    return JsonResponse({'Status': False, 'Errors': errors}, status=400)
+                updated, unmatched = patch_offers(shop.id, offers)
+                return JsonResponse({'Status': True, 'Обновлено позиций': len(updated), 'Не найдены': unmatched})
+            return JsonResponse({'Status': False, 'Error': 'Обновление прайса доступно только для продавцов'},
+                                status=403)
+        return JsonResponse({'Status': False, 'Error': 'Не пройдена аутентификация. Пожалуйста, представьтесь'},
+                            status=401)
+
+
 class CategoryView(ListAPIView):
     """
     Класс для просмотра категорий
     """
 
-    queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
+    def get_queryset(self):
+        """Все категории либо поддерево категории root_id в порядке обхода дерева"""
+        root_id = self.request.query_params.get('root_id')
+        if root_id:
+            return Category.objects.filter(path__startswith=subtree_path(root_id) or '-').order_by('path')
+        return Category.objects.all()
+
 
 class ShopView(ListAPIView):
     """
@@ -160,19 +294,53 @@ class ProductInfoView(APIView):
     """
 
     def get(self, request):
-        shop_id = request.query_params.get('shop_id')
-        category_id = request.query_params.get('category_id')
+        shop_id = request.query_params.get('shop_id', '')
+        category_id = request.query_params.get('category_id', '')
+        if not all(value.isdecimal() and len(value) <= 18 for value in (shop_id, category_id) if value):
+            return JsonResponse({'Status': False, 'Error': 'Неверный формат запроса. shop_id и category_id - '
+                                                           'целые числа'}, status=400)
+        # ключ кеша строится из нормализованных id, а не из строк запроса ('07' и '7' - одна выборка)
+        shop_id, category_id = [int(value) if value else None for value in (shop_id, category_id)]
         # Подгатавливам фильтры
         query = Q(shop__opened=True)
-        if shop_id:
+        if shop_id is not None:
             query = query & Q(shop_id=shop_id)
-        if category_id:
-            query = query & Q(product__category_id=category_id)
+        if category_id is not None:
+            # категория отбирается вместе со всем поддеревом по индексу на префикс пути
+            query = query & Q(product__category__path__startswith=subtree_path(category_id) or '-')
         # Фильтруем и отбрасываем дубликаты
         queryset = ProductInfo.objects.filter(query).select_related('shop', 'product__category').prefetch_related(
             'product_parameters__parameter').distinct()
-        serializer = ProductInfoSerializer(queryset, many=True)
-        return Response(serializer.data)
+        # одинаковые одновременные запросы выполняются в БД один раз
+        data = cached_query(f'products:{shop_id}:{category_id}',
+                            lambda: list(ProductInfoSerializer(queryset, many=True).data))
+        return Response(data)
+
+
+class AutocompleteView(APIView):
+    """
+    Класс для подсказок при наборе названия товара: поиск по префиксу в индексе, отображённом в память,
+    без запросов к БД. Параметры: q - набранный текст, limit - количество подсказок.
+    """
+
+    def get(self, request):
+        limit = request.query_params.get('limit', '')
+        return Response(autocomplete(request.query_params.get('q', ''), int(limit) if limit.isdigit() else None))
+
+
+class RelatedProductsView(APIView):
+    """
+    Класс для получения товаров, которые часто покупают вместе с указанным: предложения в наличии из открытых
+    магазинов по заранее посчитанному топу совместных покупок
+    """
+
+    def get(self, request, product_id):
+        queryset = ProductInfo.objects.filter(
+            product__related_to__product_id=product_id, shop__opened=True, quantity__gt=0).select_related(
+            'shop', 'product__category').prefetch_related('product_parameters__parameter').order_by(
+            'product__related_to__rank', 'price')
+        data = cached_query(f'related:{product_id}', lambda: list(ProductInfoSerializer(queryset, many=True).data))
+        return Response(data)
 
 
 class OpenCloseShop(APIView):
@@ -200,7 +368,13 @@ class OpenCloseShop(APIView):
                 if switch:
                     if switch in ['0', '1']:
                         switch = bool(int(switch))
-                        Shop.objects.filter(user_id=request.user.id).update(opened=switch)
+                        with transaction.atomic():
+                            shop = Shop.objects.select_for_update().filter(user_id=request.user.id).first()
+                            if shop and shop.opened != switch:
+                                Shop.objects.filter(id=shop.id).update(opened=switch)
+                                # предложения закрытого магазина не учитываются в счётчиках категорий
+                                apply_category_deltas(shop_category_counts(shop.id), sign=1 if switch else -1)
+                                transaction.on_commit(bump_catalog_version)
                         return JsonResponse({'Status': 'Магазин открыт для приёма заказов' if switch else 'Магазин закрыт'})
                     return JsonResponse({'Status': False, 'Error': 'Для открытия магазина и возможности приёма '
                                                                    'заказов введите 1, для закрытия - 0'}, status=400)
@@ -221,8 +395,7 @@ class BasketView(APIView):
                 'ordered_items__product_info__product__category',
                 'ordered_items__product_info__product_parameters__parameter').annotate(
                 total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-            serializer = OrderSerializer(basket, many=True)
-            return Response(serializer.data)
+            return Response(cached_basket(request.user.id, lambda: OrderSerializer(basket, many=True).data))
         return JsonResponse({'Status': False, 'Error': 'Не пройдена аутентификация. Пожалуйста, представьтесь'},
                             status=401)
 
@@ -239,18 +412,22 @@ class BasketView(APIView):
                 else:
                     basket, _ = Order.objects.get_or_create(user_id=request.user.id, status='basket')
                     positions = 0
-                    for item in items_dict:
-                        item.update({'order': basket.id})
-                        serializer = OrderItemSerializer(data=item)
-                        if serializer.is_valid():
-                            try:
-                                serializer.save()
-                            except IntegrityError as err:
-                                return JsonResponse({'Status': False, 'Errors': str(err)})
+                    try:
+                        for item in items_dict:
+                            item.update({'order': basket.id})
+                            serializer = OrderItemSerializer(data=item)
+                            if serializer.is_valid():
+                                try:
+                                    serializer.save()
+                                except IntegrityError as err:
+                                    return JsonResponse({'Status': False, 'Errors': str(err)})
+                                else:
+                                    positions += 1
                             else:
-                                positions += 1
-                        else:
-                            return JsonResponse({'Status': False, 'Errors': serializer.errors})
+                                return JsonResponse({'Status': False, 'Errors': serializer.errors})
+                    finally:
+                        touch_basket(basket.id)
+                        invalidate_baskets([request.user.id]) # сбрасываем и при частичном добавлении
                     return JsonResponse({'Status': True, 'В корзину добавлено позиций': positions})
             return JsonResponse({'Status': False, 'Error': 'Информация о товарах для добавления в корзину '
                                                            'не передана'}, status=403)
@@ -273,6 +450,8 @@ class BasketView(APIView):
                     for item in items_dict:
                         OrderItem.objects.filter(order_id=basket.id, id=item['id']).update(quantity=item['quantity'])
                         positions += 1
+                    touch_basket(basket.id)
+                    invalidate_baskets([request.user.id])
                     return JsonResponse({'Status': True, 'Обновлено количество товара по числу позиций': positions})
             return JsonResponse({'Status': False, 'Error': 'Информация о товарах для уточнения количества '
                                                            'не передана'}, status=403)
@@ -286,6 +465,8 @@ class BasketView(APIView):
             if item.isdigit():
                 basket = Order.objects.get(user_id=request.user.id, status='basket')
                 OrderItem.objects.get(order_id=basket.id, id=item).delete()
+                touch_basket(basket.id)
+                invalidate_baskets([request.user.id])
                 return JsonResponse({'Status': 'Товар удалён'})
             return JsonResponse({'Status': False, 'Error': 'Для удаления товара передайте его id'}, status=403)
         return JsonResponse({'Status': False, 'Error': 'Не пройдена аутентификация. Пожалуйста, представьтесь'},
@@ -305,9 +486,9 @@ class ContactView(APIView):
         '''Добавление нового адреса доставки'''
         if request.user.is_authenticated:
             if {'region', 'city', 'street', 'house'}.issubset(request.data):
-                request.data._mutable = True
-                request.data['user'] = request.user.id
-                serializer = ContactSerializer(data=request.data)
+                data = {key: request.data.get(key) for key in request.data} # QueryDict формы неизменяемый
+                data['user'] = request.user.id
+                serializer = ContactSerializer(data=data)
                 if serializer.is_valid():
                     serializer.save()
                     return Response(serializer.data)
@@ -320,7 +501,7 @@ class ContactView(APIView):
     def patch(self, request):
         '''Уточнение адреса доставки (редактирование комментария, исправление ошибок'''
         if request.user.is_authenticated:
-            if request.data['contact_id'].isdigit():
+            if str(request.data.get('contact_id', '')).isdigit():
                 contact = Contact.objects.filter(user_id=request.user.id, id=request.data['contact_id']).first()
                 if contact:
                     serializer = ContactSerializer(contact, data=request.data, partial=True)
@@ -352,19 +533,30 @@ class OrderView(APIView):
     def get(self, request):
         if request.user.is_authenticated:
             order = Order.objects.filter(user_id=request.user.id).exclude(status='basket').select_related(
-                'address').prefetch_related('ordered_items__product_info__product_parameters__parameter').annotate(
-                total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
+                'address').prefetch_related('ordered_items__product_info__product_parameters__parameter',
+                                            'shipments').annotate(total_sum=Sum(
+                F('ordered_items__quantity') * Coalesce(F('ordered_items__price'),
+                                                        F('ordered_items__product_info__price')))).distinct()
             serializer = OrderSerializer(order, many=True)
-            return Response(serializer.data)
+            return Response(serializer.data + archived_orders(request.user.id)) # старые заказы дочитываем из архива
         return JsonResponse({'Status': False, 'Error': 'Не пройдена аутентификация. Пожалуйста, представьтесь'},
                             status=401)
 
     def post(self, request):
         if request.user.is_authenticated:
             if 'contact_id' in request.data:
-                Order.objects.filter(user_id=request.user.id, status='basket').update(
-                    address_id=request.data['contact_id'], status='new')
-                order = Order.objects.filter(user_id=request.user.id, status='new').first()
+                with transaction.atomic():
+                    basket_ids = list(Order.objects.select_for_update().filter(
+                        user_id=request.user.id, status='basket').values_list('id', flat=True))
+                    if not basket_ids:
+                        return JsonResponse({'Status': False, 'Error': 'Корзина пуста'}, status=400)
+                    Order.objects.filter(id__in=basket_ids).update(address_id=request.data['contact_id'], status='new')
+                    fix_prices(basket_ids) # суммы отправлений и витрины считаются по ценам на момент оформления
+                    create_shipments(basket_ids) # делим заказ на отправления по магазинам
+                    record_events('created', Shipment.objects.filter(order_id__in=basket_ids))
+                    apply_orders(basket_ids) # учитываем заказ в витринах продаж магазинов
+                    transaction.on_commit(lambda: invalidate_baskets([request.user.id]))
+                order = Order.objects.filter(id__in=basket_ids).first()
                 new_order.send(sender=self.__class__, order=order)
                 return JsonResponse({'Status': 'Заказ принят'})
             return JsonResponse({'Status': False, 'Error': 'Неверный формат запроса. Не передана информация об '
@@ -374,16 +566,240 @@ class OrderView(APIView):
 
 
 class SellerOrdersView(APIView):
-    ''' Класс для получения заказов продавцами'''
+    '''
+    Класс для получения заказов продавцами: отправления своего магазина с его позициями,
+    можно отобрать по статусу параметром status
+    '''
 
     def get(self, request, *args, **kwargs):
         if request.user.is_authenticated:
             if request.user.type == 'seller':
-                orders = Order.objects.filter(ordered_items__product_info__shop__user_id=request.user.id).exclude(
-                    status='basket').select_related('address').prefetch_related('ordered_items__product_info').annotate(
-                    total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-                serializer = OrderSerializer(orders, many=True)
-                return Response(serializer.data)
+                shop_items = OrderItem.objects.filter(product_info__shop__user_id=request.user.id).select_related(
+                    'product_info__product__category').prefetch_related('product_info__product_parameters__parameter')
+                shipments = Shipment.objects.filter(shop__user_id=request.user.id).select_related(
+                    'order').prefetch_related(Prefetch('order__ordered_items', queryset=shop_items,
+                                                       to_attr='shop_items'))
+                status = request.query_params.get('status')
+                if status:
+                    shipments = shipments.filter(status=status)
+                serializer = ShipmentSerializer(shipments, many=True)
+                return Response(serializer.data + archived_shipments(request.user.id, status))
             return JsonResponse({'Status': False, 'Error': 'Получение заказов доступно для продавцов'}, status=403)
         return JsonResponse({'Status': False, 'Error': 'Не пройдена аутентификация. Пожалуйста, представьтесь'},
                             status=401)
+
+
+class OrderStatusView(APIView):
+    """
+    Класс для массовой смены статуса заказов продавцами и сотрудниками.
+    Переход выполняется атомарно для всей пачки, покупатели получают по одному письму.
+    """
+
+    max_orders = 1000
+
+    def post(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            if request.user.type == 'seller' or request.user.is_staff:
+                status = request.data.get('status')
+                orders = request.data.get('orders')
+                if status not in dict(STATUS_CHOICES) or not orders:
+                    return JsonResponse({'Status': False, 'Error': 'Не переданы id заказов и/или корректный статус'},
+                                        status=400)
+                if isinstance(orders, str):
+                    try:
+                        orders = load_json(orders)
+                    except ValueError:
+                        orders = None
+                if not isinstance(orders, list) or not all(isinstance(item, int) for item in orders):
+                    return JsonResponse({'Status': False, 'Error': 'Неверный формат запроса. Передайте список id '
+                                                                   'заказов'}, status=400)
+                if len(orders) > self.max_orders:
+                    return JsonResponse({'Status': False, 'Error': f'За один запрос можно изменить не более '
+                                                                   f'{self.max_orders} заказов'}, status=400)
+                errors = transition_orders(orders, status, request.user)
+                if errors:
+                    return JsonResponse({'Status': False, 'Errors': errors}, status=400)
+                return JsonResponse({'Status': True, 'Обновлено заказов': len(set(orders))})
+            return JsonResponse({'Status': False, 'Error': 'Смена статуса заказов доступна для продавцов'}, status=403)
+        return JsonResponse({'Status': False, 'Error': 'Не пройдена аутентификация. Пожалуйста, представьтесь'},
+                            status=401)
+
+
+class OrderEventsView(View):
+    """
+    Поток событий заказов (server-sent events) для покупателей и продавцов вместо частого опроса списков заказов.
+    Асинхронное представление: соединение держится без занятого потока сервера при запуске через orders/asgi.py.
+    Аутентификация по заголовку Authorization: Token ...; продолжение потока - заголовок Last-Event-ID
+    или параметр last_id, без них отдаются только новые события. Запросы к БД идут через общий опрос событий
+    процесса, соединение в потоке запроса на время жизни потока не открывается.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        poller = get_poller()
+        try:
+            user_auth = await poller.query(ExpiringTokenAuthentication().authenticate, request)
+        except AuthenticationFailed as err:
+            return JsonResponse({'Status': False, 'Error': str(err.detail)}, status=401)
+        if not user_auth:
+            return JsonResponse({'Status': False, 'Error': 'Не пройдена аутентификация. Пожалуйста, представьтесь'},
+                                status=401)
+        user = user_auth[0]
+        last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_id')
+        if last_id is None:
+            last_id = await poller.query(last_event_id, user.id)
+        elif not last_id.isdigit():
+            return JsonResponse({'Status': False, 'Error': 'Неверный формат Last-Event-ID'}, status=400)
+        response = StreamingHttpResponse(event_stream(user.id, int(last_id)), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no' # nginx не должен буферизовать поток
+        return response
+
+
+class SellerAnalyticsView(APIView):
+    """
+    Класс для получения продавцами аналитики продаж (выручка, единицы, заказы, топ товаров) по дням/неделям/месяцам.
+    Данные берутся из предагрегированных витрин, а не из заказов.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            if request.user.type == 'seller':
+                shop = Shop.objects.filter(user_id=request.user.id).first()
+                if not shop:
+                    return JsonResponse({'Status': False, 'Error': 'Магазин продавца не найден'}, status=404)
+                period = request.query_params.get('period', 'day')
+                if period not in PERIODS:
+                    return JsonResponse({'Status': False, 'Error': 'Период группировки: day, week или month'},
+                                        status=400)
+                dates = {}
+                for name in ('date_from', 'date_to'):
+                    value = request.query_params.get(name)
+                    try:
+                        dates[name] = parse_date(value) if value else None
+                    except ValueError:
+                        dates[name] = None
+                    if value and not dates[name]:
+                        return JsonResponse({'Status': False, 'Error': f'Неверный формат {name}, ожидается ГГГГ-ММ-ДД'},
+                                            status=400)
+                top = request.query_params.get('top', '5')
+                if not top.isdigit():
+                    return JsonResponse({'Status': False, 'Error': 'Параметр top должен быть числом'}, status=400)
+                report = shop_sales(shop.id, period, dates['date_from'], dates['date_to'], int(top))
+                return Response({'shop': shop.name, 'period': period, **report})
+            return JsonResponse({'Status': False, 'Error': 'Аналитика продаж доступна для продавцов'}, status=403)
+        return JsonResponse({'Status': False, 'Error': 'Не пройдена аутентификация. Пожалуйста, представьтесь'},
+                            status=401)
+
+
+class BatchView(APIView):
+    """
+    Класс для пакетного выполнения запросов мобильного клиента за один сетевой обмен и одну аутентификацию.
+    Принимает список requests из объектов {id, method, path, body}, где path - адрес API (например
+    /api/v1/market/categories). Возвращает статус и ответ по каждому запросу.
+    """
+
+    max_requests = 20
+
+    def post(self, request, *args, **kwargs):
+        items = request.data.get('requests')
+        if isinstance(items, str):
+            try:
+                items = load_json(items)
+            except ValueError:
+                items = None
+        if not isinstance(items, list) or not items or not all(
+                isinstance(item, dict) and str(item.get('method', '')).upper() in BATCH_METHODS and
+                isinstance(item.get('path'), str) for item in items):
+            return JsonResponse({'Status': False, 'Error': 'Неверный формат запроса. Передайте список requests с '
+                                                           'методом и адресом каждого запроса'}, status=400)
+        if len(items) > self.max_requests:
+            return JsonResponse({'Status': False, 'Error': f'В пакете может быть не более {self.max_requests} '
+                                                           f'запросов'}, status=400)
+        items = [dict(item, method=item['method'].upper()) for item in items]
+        return JsonResponse({'Status': True, 'Responses': run_batch(request, items)})
+
+
+class AdmissionStatsView(APIView):
+    """
+    Класс для мониторинга перегрузки: счётчики контроля допуска и ограничения частоты запросов текущего процесса
+    """
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            if request.user.is_staff:
+                return JsonResponse({'Admission': {name: gate.stats() for name, gate in get_gates().items()},
+                                     'Throttled': dict(throttled)})
+            return JsonResponse({'Status': False, 'Error': 'Мониторинг доступен только сотрудникам'}, status=403)
+        return JsonResponse({'Status': False, 'Error': 'Не пройдена аутентификация. Пожалуйста, представьтесь'},
+                            status=401)
+
+
+class TokenStatsView(APIView):
+    """
+    Класс для мониторинга хранилища токенов: размеры таблиц и итог последней очистки просроченных токенов
+    """
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            if request.user.is_staff:
+                return JsonResponse({'Tables': table_sizes(), 'LastPrune': last_prune()})
+            return JsonResponse({'Status': False, 'Error': 'Мониторинг доступен только сотрудникам'}, status=403)
+        return JsonResponse({'Status': False, 'Error': 'Не пройдена аутентификация. Пожалуйста, представьтесь'},
+                            status=401)
+
+
+class ProductMatchesView(APIView):
+    """
+    Класс для очереди проверки сомнительных совпадений товаров при импорте прайсов.
+    GET - ожидающие решения совпадения (фильтр category_id), POST - решение по совпадению {id, accept}.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            if request.user.is_staff:
+                category_id = request.query_params.get('category_id', '')
+                return JsonResponse({'Matches': pending_matches(int(category_id) if category_id.isdigit() else None)})
+            return JsonResponse({'Status': False, 'Error': 'Проверка совпадений доступна только сотрудникам'},
+                                status=403)
+        return JsonResponse({'Status': False, 'Error': 'Не пройдена аутентификация. Пожалуйста, представьтесь'},
+                            status=401)
+
+    def post(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            if request.user.is_staff:
+                match_id = str(request.data.get('id', ''))
+                accept = request.data.get('accept')
+                if not match_id.isdigit() or str(accept).lower() not in ('true', 'false', '1', '0'):
+                    return JsonResponse({'Status': False, 'Error': 'Передайте id совпадения и решение accept'},
+                                        status=400)
+                state = resolve_match(int(match_id), str(accept).lower() in ('true', '1'))
+                if state is None:
+                    return JsonResponse({'Status': False, 'Error': 'Совпадение не найдено или уже проверено'},
+                                        status=404)
+                if state == 'conflict':
+                    return JsonResponse({'Status': False, 'Error': 'У товара-кандидата уже есть позиция того же '
+                                                                   'магазина с тем же внешним ИД'}, status=409)
+                return JsonResponse({'Status': True, 'State': state})
+            return JsonResponse({'Status': False, 'Error': 'Проверка совпадений доступна только сотрудникам'},
+                                status=403)
+        return JsonResponse({'Status': False, 'Error': 'Не пройдена аутентификация. Пожалуйста, представьтесь'},
+                            status=401)
+
+
+class ProfilesView(APIView):
+    """
+    Класс для просмотра профилей медленных запросов сотрудниками: список со сводкой или загрузка файла pstats
+    """
+
+    def get(self, request, url_name=None, name=None, *args, **kwargs):
+        if request.user.is_authenticated:
+            if request.user.is_staff:
+                if name is None:
+                    return JsonResponse({'Profiles': list_profiles()})
+                path = profile_path(url_name, name)
+                if path is None:
+                    return JsonResponse({'Status': False, 'Error': 'Профиль не найден'}, status=404)
+                return FileResponse(path.open('rb'), as_attachment=True, filename=f'{url_name}-{name}')
+            return JsonResponse({'Status': False, 'Error': 'Профили доступны только сотрудникам'}, status=403)
+        return JsonResponse({'Status': False, 'Error': 'Не пройдена аутентификация. Пожалуйста, представьтесь'},
+                            status=401)
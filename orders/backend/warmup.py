@@ -0,0 +1,73 @@
+import io
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+
+
+def warmup_settings():
+    config = {'PATHS': ['/api/v1/market/categories', '/api/v1/market/shops', '/api/v1/market/products'],
+              'AUTOCOMPLETE': True}
+    config.update(getattr(settings, 'WARMUP', {}))
+    return config
+
+
+def wsgi_request(application, path, host=None):
+    """Внутренний GET-запрос к WSGI-приложению без сети. Возвращает (код ответа, время в мс)."""
+    host = host or next((name for name in settings.ALLOWED_HOSTS if '*' not in name and not name.startswith('.')),
+                        'localhost')
+    path, _, query = path.partition('?')
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SERVER_NAME': host,
+               'SERVER_PORT': '80', 'HTTP_HOST': host, 'REMOTE_ADDR': '127.0.0.1', 'SERVER_PROTOCOL': 'HTTP/1.1',
+               'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+               'wsgi.version': (1, 0), 'wsgi.multithread': False, 'wsgi.multiprocess': True,
+               'wsgi.run_once': False}
+    status = []
+    started = time.perf_counter()
+    response = application(environ, lambda code, headers, exc_info=None: status.append(code))
+    try:
+        for _ in response: # тело дочитываем, чтобы отработали потоковые ответы
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return int(status[0].split()[0]), (time.perf_counter() - started) * 1000
+
+
+def warm_up(application=None):
+    """
+    Прогрев приложения в главном процессе до запуска рабочих (gunicorn с preload_app): импорт всех
+    представлений через URLconf, открытие индекса автодополнения и внутренние запросы к каталогу, которые заполняют
+    общий кеш и догружают лениво импортируемые модули. Дочерние процессы получают всё это копией при fork.
+    Соединения с БД в конце закрываются, чтобы рабочие процессы не унаследовали общий сокет.
+    Возвращает {путь: (код ответа, мс)}.
+    """
+
+    config = warmup_settings()
+    results = {}
+    try:
+        get_resolver().url_patterns # импортирует urls.py и все модули представлений
+        if config['AUTOCOMPLETE']:
+            from .autocomplete import get_index
+
+            get_index(build=True) # первый запрос не должен строить индекс
+        if application is not None:
+            for path in config['PATHS']:
+                results[path] = wsgi_request(application, path)
+    finally:
+        connections.close_all()
+    return results
+
+
+def warm_worker():
+    """
+    Прогрев рабочего процесса после fork: собственные соединения с БД открываются до первого запроса.
+    Соединения Django привязаны к потоку, поэтому прогрев полезен только рабочим, обслуживающим запросы в главном
+    потоке (gunicorn sync), и только с постоянными соединениями (CONN_MAX_AGE), иначе соединение закроется
+    в начале запроса.
+    """
+
+    for connection in connections.all():
+        if connection.settings_dict['CONN_MAX_AGE']:
+            connection.ensure_connection()
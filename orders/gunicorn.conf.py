@@ -0,0 +1,66 @@
+"""
+Настройки gunicorn: gunicorn -c gunicorn.conf.py (из каталога orders).
+
+Приложение загружается и прогревается один раз в главном процессе (preload_app), рабочие процессы получают
+импортированные модули, открытый индекс автодополнения и заполненный кеш каталога копией при fork, поэтому новый
+рабочий готов к запросам сразу.
+
+Поток событий user/events - асинхронное представление с соединением на несколько минут, он работает только под
+ASGI: под WSGI Django дочитывает асинхронный поток целиком до отправки, а синхронный рабочий занят таким
+запросом целиком и снимается по timeout. Поэтому при установленном uvicorn по умолчанию запускается orders.asgi
+с рабочими UvicornWorker. Без uvicorn запускается WSGI с многопоточными рабочими gthread, и адрес
+/api/v1/user/events нужно направить на отдельный ASGI-сервер (например, location в nginx на
+uvicorn orders.asgi:application).
+
+Под ASGI постоянные соединения с БД не переиспользуются между запросами (каждый выполняется в своём потоке),
+поэтому orders.asgi по умолчанию отключает их (CONN_MAX_AGE=0). Заранее соединения открываются только
+в рабочих sync, обслуживающих запросы в главном потоке.
+"""
+
+import multiprocessing
+import os
+from importlib.util import find_spec
+
+if find_spec('uvicorn'):
+    default_app, default_worker = 'orders.asgi:application', 'uvicorn.workers.UvicornWorker'
+else:
+    default_app, default_worker = 'orders.wsgi:application', 'gthread'
+
+wsgi_app = os.getenv('GUNICORN_APP', default_app)
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', default_worker)
+threads = int(os.getenv('GUNICORN_THREADS', 4)) # для gthread: запросов одновременно в одном рабочем
+preload_app = True
+timeout = 60
+max_requests = 5000 # рабочие перезапускаются по очереди, с preload это дешёво
+max_requests_jitter = 500
+
+
+def when_ready(server):
+    """Главный процесс: приложение уже загружено, рабочие ещё не запущены"""
+    from backend.warmup import warm_up
+    from orders.wsgi import application # внутренние запросы прогрева идут через WSGI и для ASGI-сервера
+
+    for path, (status, elapsed) in warm_up(application).items():
+        server.log.info('warm-up %s: %s, %.1f ms', path, status, elapsed)
+
+
+def post_fork(server, worker):
+    """Унаследованные от главного процесса соединения с БД рабочему не принадлежат, забываем их без закрытия"""
+    from django.db import connections
+
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
+
+
+def post_worker_init(worker):
+    """
+    Соединения с БД открываем заранее только в рабочих sync: они обслуживают запросы в главном потоке.
+    Рабочие gthread и UvicornWorker выполняют запросы в других потоках, где соединение главного потока не видно.
+    """
+    if worker_class != 'sync':
+        return
+    from backend.warmup import warm_worker
+
+    warm_worker()
@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'orders.settings')
+# под ASGI синхронный код каждого запроса выполняется в своём потоке, постоянное соединение не переиспользуется
+# следующими запросами, а лишь остаётся открытым до истечения CONN_MAX_AGE
+os.environ.setdefault('CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+from importlib.util import find_spec
 
 from dotenv import load_dotenv
 from pathlib import Path
@@ -51,6 +52,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'backend.middleware.CompressionMiddleware', # сжимает итоговое тело ответа, поэтому стоит выше остальных
+    'backend.middleware.AdmissionControlMiddleware', # до сессий и аутентификации, чтобы отказ был дешёвым
+    'backend.middleware.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -91,6 +95,10 @@ DATABASES = {
         'PASSWORD': os.getenv('PASSWORD'),
         'HOST': os.getenv('HOST', '127.0.0.1'),
         'PORT': os.getenv('PORT', '5432'),
+        # постоянные соединения для WSGI: рабочий процесс открывает соединение при старте и переиспользует его;
+        # orders.asgi по умолчанию выставляет CONN_MAX_AGE=0
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -150,6 +158,117 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication', # аутентификация по токенам вместо стандартной по сессиям
+        'backend.authentication.ExpiringTokenAuthentication', # аутентификация по токенам с ограниченным сроком жизни
     ),
-}
\ No newline at end of file
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'backend.renderers.CompactJSONRenderer', # колоночный JSON для списков
+    ] + (['backend.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'backend.throttling.TokenRateThrottle',
+        'backend.throttling.AnonymousRateThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'token': '300/min',
+        'anon': '60/min',
+    },
+}
+
+# Срок жизни токенов в часах, проверяется при каждом использовании токена.
+# Просроченные строки удаляются по расписанию командой prune_tokens
+TOKEN_TTL_HOURS = {
+    'confirm_email': 72, # подтверждение электронной почты
+    'auth': 24 * 30, # вход по API
+    'password_reset': 24, # сброс пароля
+}
+DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME = TOKEN_TTL_HOURS['password_reset']
+
+# Ограничение одновременных запросов на процесс по именам адресов из backend/urls.py:
+# limit - выполняются одновременно, queue - ждут освобождения не дольше timeout секунд, остальным 503
+ADMISSION_CONTROL = {
+    'seller-update': {'limit': 2, 'queue': 2, 'timeout': 1.0},
+    'seller-orders': {'limit': 4, 'queue': 8, 'timeout': 2.0},
+    'seller-analytics': {'limit': 4, 'queue': 8, 'timeout': 2.0},
+    'market-products': {'limit': 8, 'queue': 16, 'timeout': 2.0},
+}
+ADMISSION_RETRY_AFTER = 2 # секунд, значение заголовка Retry-After при отказе
+
+# Сжатие ответов (brotli при наличии пакета, иначе gzip) начиная с заданного размера в байтах
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Кеши: локальный в памяти процесса и общий файловый для всех процессов сервера на одной машине
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'baskets': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'baskets',
+        'OPTIONS': {'MAX_ENTRIES': 20000}, # при переполнении вытесняется часть записей
+    },
+}
+
+# Кеширование выборок каталога с защитой от одновременного пересчёта (stale-while-revalidate)
+CATALOG_CACHE_ALIAS = 'shared'
+CATALOG_CACHE_TTL = 60 # секунд результат считается свежим
+CATALOG_CACHE_STALE_TTL = 600 # сколько ещё секунд устаревший результат отдаётся, пока пересчитывается новый
+CATALOG_CACHE_LOCK_TIMEOUT = 30
+CATALOG_CACHE_LOCK_STRIPES = 256 # файлов блокировки на все ключи, ключ попадает в полосу по хешу
+
+# Поток событий заказов user/events: период общего для процесса опроса таблицы событий и пинга в секундах, время
+# жизни соединения, пауза перед переподключением клиента в миллисекундах, окно в секундах, за которое перечитываются
+# события, зафиксированные не в порядке id
+ORDER_EVENTS = {
+    'POLL': 1.0,
+    'HEARTBEAT': 15,
+    'MAX_AGE': 300,
+    'RETRY_MS': 3000,
+    'LAG': 30,
+}
+
+# Индекс автодополнения товаров: снимок на диске отображается в память всеми процессами сервера.
+# Для префиксов, с которых начинается больше HOT_RANGE ключей, топ подсказок считается заранее
+AUTOCOMPLETE = {
+    'PATH': BASE_DIR / '.autocomplete' / 'products.idx',
+    'LIMIT': 10,
+    'HOT_RANGE': 256,
+    'CHECK_INTERVAL': 1.0, # секунд между проверками, не подменён ли снимок
+}
+
+# Прогрев приложения перед fork рабочих процессов (orders/gunicorn.conf.py): внутренние запросы к PATHS
+# заполняют общий кеш каталога, AUTOCOMPLETE - открыть индекс автодополнения
+WARMUP = {
+    'PATHS': ['/api/v1/market/categories', '/api/v1/market/shops', '/api/v1/market/products'],
+    'AUTOCOMPLETE': True,
+}
+
+# Нечёткое сопоставление товаров при импорте: сходство триграмм для очереди проверки (REVIEW), кандидатов
+# на позицию, бюджет сопоставления в секундах на 10 тысяч позиций прайса. Автоматически связываются только позиции
+# с той же моделью или теми же значимыми словами названия
+PRODUCT_MATCHING = {
+    'REVIEW': 0.45,
+    'CANDIDATES': 50,
+    'BUDGET': 2.0,
+}
+
+# Кеш отрисованных корзин покупателей: сбрасывается при изменении корзины, оформлении заказа и смене цен
+BASKET_CACHE_ALIAS = 'baskets'
+BASKET_CACHE_TTL = 3600
+
+# Выборочное профилирование медленных запросов (профили доступны сотрудникам по адресу service/profiles)
+PROFILING = {
+    'SAMPLE_RATE': float(os.getenv('PROFILING_SAMPLE_RATE', 0)), # доля профилируемых запросов, 0 - только по заголовку
+    'SLOW_MS': 500, # сохраняются профили запросов медленнее порога
+    'HEADER': 'X-Profile', # заголовок принудительного профилирования для сотрудников
+    'DIR': BASE_DIR / '.profiles',
+    'KEEP': 20, # профилей на каждый адрес
+    'TOP': 30, # функций в сводке профиля
+}